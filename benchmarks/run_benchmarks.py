@@ -0,0 +1,266 @@
+"""
+Created on Mon Oct 19 17:31:26 2026
+
+@author: Malte Güth
+"""
+
+# Benchmarks of every stage of the pipeline on synthetic data (see synthetic_eeg.py), so that changes that slow the
+# scripts down or make them use more memory are noticed before they are used on a whole study. Each stage runs the
+# same functions as the script it stands for:
+#
+#   import        mne.io.read_raw_fif(preload=True) of a saved recording        (data_import.py)
+#   filter        raw.filter(0.5, 30, fir_design='firwin')                       (data_import.py)
+#   reference     raw.set_eeg_reference('average')                               (data_import.py)
+#   chunked       process_chunked (filter, reference and down-sample to 250 Hz)  (data_import.py)
+#   ica           fit_ica with automatic decimation                              (basic_data_cleaning.py)
+#   events        mne.find_events and recode_events                              (complex_epoching.py, import_epochs.py)
+#   epoching      mne.Epochs(..., preload=True)                                  (complex_epoching.py)
+#   tfr_total     total_power with a bank of 30 wavelets                         (total_power_custom.py)
+#   tfr_induced   TFRAccumulator with 50 wavelets and decim=3                    (total_and_induced_power.py)
+#   psd           psd_batched (multitaper spectra)                               (power_spectral_density.py)
+#   decoding      decode_windows in 100 ms windows                       (representational_similarity_analysis.py)
+#
+# Run it from this folder, e.g. for the sampling rates of the lab (1000 Hz) and of the scanner (5000 Hz):
+#
+#   python run_benchmarks.py --sfreq 1000 5000 --duration 60 --output ./results/before.json
+#   python run_benchmarks.py --sfreq 1000 5000 --duration 60 --output ./results/after.json \
+#       --compare ./results/before.json
+#
+# Every stage is timed repeat times and the fastest run is kept (wall time and CPU time of this process). Peak memory is
+# measured in one extra run with tracemalloc, which counts all memory allocated by numpy and Python during the stage
+# (beyond what was allocated before it). tracemalloc slows Python code down, so this run is not timed. The results
+# file (JSON) holds one record per stage and sampling rate, plus the versions of Python, numpy, scipy and MNE and the
+# git commit of the repository. --compare lists all stages that became slower or needed more memory than tolerance
+# (by default 20 %) compared to an earlier results file, and the script then exits with status 1.
+
+import argparse
+import collections
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+
+import mne
+
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for _folder in ('preprocessing', 'time_frequency', 'music_similarities'):
+    sys.path.append(os.path.join(_root, _folder))
+
+from chunked_raw import process_chunked
+from decoding import decode_windows, sliding_windows
+from event_recoding import recode_events
+from ica_fitting import fit_ica
+from multitaper import psd_batched
+from synthetic_eeg import synthetic_raw
+from tfr_accumulator import TFRAccumulator
+from wavelet_engine import morlet_bank, total_power
+
+
+def measure(func, setup=None, repeat=1, memory=True):
+    """Time func(*setup()) repeat times and measure its peak memory in one more run.
+
+    setup prepares the arguments (e.g. a copy of the data) outside of the measurement. Returns the result of the last
+    run and a dict with the fastest wall and CPU time in seconds and the peak memory in bytes.
+    """
+    wall, cpu = [], []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        result = func(*args)
+        wall.append(time.perf_counter() - start_wall)
+        cpu.append(time.process_time() - start_cpu)
+        del args
+
+    stats = collections.OrderedDict(wall_seconds=min(wall), wall_median=float(np.median(wall)), cpu_seconds=min(cpu),
+                                    peak_bytes=None)
+    if memory:
+        args = setup() if setup is not None else ()
+        tracemalloc.start()
+        try:
+            func(*args)
+            stats['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, stats
+
+
+def run_suite(sfreq, n_channels=64, duration=60., event_rate=1., n_components=25, repeat=1, memory=True,
+              stages=None):
+    """Run all stages (or those named in stages) on a synthetic recording and return one record per stage."""
+    records = []
+    workdir = tempfile.mkdtemp(prefix='mpp_benchmark_')
+
+    def record(stage, stats, n_items, unit):
+        stats = collections.OrderedDict(stage=stage, sfreq=sfreq, n_channels=n_channels, duration=duration,
+                                        n_items=int(n_items), unit=unit, **stats)
+        stats['throughput'] = n_items / stats['wall_seconds'] if stats['wall_seconds'] > 0 else None
+        records.append(stats)
+        print('%-12s %6g Hz  %8.3f s  %10.3g %s/s  %s' % (
+            stage, sfreq, stats['wall_seconds'], stats['throughput'] or 0, unit,
+            '' if stats['peak_bytes'] is None else '%.1f MB' % (stats['peak_bytes'] / 1e6)))
+
+    def wanted(stage):
+        return stages is None or stage in stages
+
+    try:
+        raw = synthetic_raw(n_channels, sfreq, duration, event_rate)
+        n_samples = n_channels * raw.n_times
+        raw_file = os.path.join(workdir, 'synthetic-raw.fif')
+        raw.save(raw_file, verbose=False)
+
+        if wanted('import'):
+            raw, stats = measure(lambda: mne.io.read_raw_fif(raw_file, preload=True, verbose=False),
+                                 repeat=repeat, memory=memory)
+            record('import', stats, n_samples, 'samples')
+
+        if wanted('filter'):
+            raw, stats = measure(lambda raw: raw.filter(0.5, 30., fir_design='firwin', verbose=False),
+                                 lambda: (raw.copy(),), repeat, memory)
+            record('filter', stats, n_samples, 'samples')
+
+        if wanted('reference'):
+            raw, stats = measure(lambda raw: raw.set_eeg_reference('average', projection=False, verbose=False),
+                                 lambda: (raw.copy(),), repeat, memory)
+            record('reference', stats, n_samples, 'samples')
+
+        if wanted('chunked'):
+            raw_lazy = mne.io.read_raw_fif(raw_file, preload=False, verbose=False)
+            out_file = os.path.join(workdir, 'synthetic-filt.npy')
+            _, stats = measure(lambda: process_chunked(raw_lazy, out_file, l_freq=0.5, h_freq=30.,
+                                                       ref_channels='average', sfreq_new=250),
+                               repeat=repeat, memory=memory)
+            record('chunked', stats, n_samples, 'samples')
+
+        if wanted('ica'):
+            _, stats = measure(lambda: fit_ica(raw, n_components=min(n_components, n_channels), random_state=0)[0],
+                               repeat=repeat, memory=memory)
+            record('ica', stats, n_samples, 'samples')
+
+        events, stats = measure(lambda: recode_events(mne.find_events(raw, stim_channel='STI 014', verbose=False),
+                                                      {1: 1, 2: 2, 3: 3, 4: 4}, unmapped='drop'),
+                                repeat=repeat, memory=memory)
+        if wanted('events'):
+            record('events', stats, raw.n_times, 'samples')
+
+        event_id = {'A': 1, 'B/1': 2, 'B/2': 3, 'C': 4}
+        picks = mne.pick_types(raw.info, meg=False, eeg=True)
+        epochs, stats = measure(lambda: mne.Epochs(raw, events, event_id, tmin=-0.2, tmax=1., baseline=(None, 0),
+                                                   picks=picks, preload=True, verbose=False),
+                                repeat=repeat, memory=memory)
+        if wanted('epoching'):
+            record('epoching', stats, len(epochs), 'epochs')
+        data = epochs.get_data()
+
+        if wanted('tfr_total'):
+            freqs = np.logspace(np.log10(1), np.log10(30), 30)
+            cycles = np.logspace(np.log10(3), np.log10(10), 30)
+            _, stats = measure(lambda: total_power(data, morlet_bank(sfreq, data.shape[-1], freqs, cycles)),
+                               repeat=repeat, memory=memory)
+            record('tfr_total', stats, len(data), 'epochs')
+
+        if wanted('tfr_induced'):
+            freqs = np.logspace(*np.log10([1, 50]), num=50)
+            cycles = np.logspace(np.log10(3), np.log10(10), 50)
+            bank = morlet_bank(sfreq, data.shape[-1], freqs, cycles)
+
+            def accumulate():
+                accumulator = TFRAccumulator(bank, decim=3)
+                accumulator.add_epochs(data)
+                return accumulator.induced()
+            _, stats = measure(accumulate, repeat=repeat, memory=memory)
+            record('tfr_induced', stats, len(data), 'epochs')
+
+        if wanted('psd'):
+            _, stats = measure(lambda: psd_batched(data, sfreq, fmin=1, fmax=60), repeat=repeat, memory=memory)
+            record('psd', stats, len(data), 'epochs')
+
+        if wanted('decoding'):
+            windows = sliding_windows(0., 1., 0.1, 0.1)
+            _, stats = measure(lambda: decode_windows(data, epochs.times, epochs.events[:, 2], windows),
+                               repeat=repeat, memory=memory)
+            record('decoding', stats, len(data), 'epochs')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return records
+
+
+def environment():
+    # Versions of everything that affects the timings, and the commit of the repository.
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=_root,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return collections.OrderedDict(date=datetime.datetime.now().isoformat(), commit=commit,
+                                   python=platform.python_version(), numpy=np.__version__, scipy=scipy.__version__,
+                                   mne=mne.__version__, machine=platform.machine(), cpu_count=os.cpu_count())
+
+
+def save_results(records, filename):
+    """Write the records with the environment to filename (JSON)."""
+    if os.path.dirname(filename) and not os.path.isdir(os.path.dirname(filename)):
+        os.makedirs(os.path.dirname(filename))
+    with open(filename, 'w') as fid:
+        json.dump(collections.OrderedDict(environment=environment(), records=records), fid, indent=1)
+
+
+def compare_results(baseline_file, current_file, tolerance=0.2):
+    """Stages of current_file that are slower or need more memory than in baseline_file by more than tolerance.
+
+    Returns a list of (stage, sfreq, measure, baseline value, current value).
+    """
+    def load(filename):
+        with open(filename) as fid:
+            records = json.load(fid)['records']
+        return dict(((rec['stage'], rec['sfreq'], rec['n_channels'], rec['duration']), rec) for rec in records)
+
+    baseline, current = load(baseline_file), load(current_file)
+    regressions = []
+    for key in sorted(set(baseline) & set(current), key=str):
+        for name in ('wall_seconds', 'peak_bytes'):
+            old, new = baseline[key][name], current[key][name]
+            if old is not None and new is not None and new > old * (1 + tolerance):
+                regressions.append((key[0], key[1], name, old, new))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic EEG data.')
+    parser.add_argument('--sfreq', type=float, nargs='+', default=[250., 1000., 5000.])
+    parser.add_argument('--channels', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=60., help='length of the recording in seconds')
+    parser.add_argument('--event-rate', type=float, default=1., help='events per second')
+    parser.add_argument('--components', type=int, default=25, help='number of ICA components')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--stages', nargs='+', default=None)
+    parser.add_argument('--no-memory', action='store_true', help='skip the extra run that measures memory')
+    parser.add_argument('--output', default='./results/benchmark-%s.json'
+                        % datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+    parser.add_argument('--compare', default=None, help='an earlier results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    records = []
+    for sfreq in args.sfreq:
+        records.extend(run_suite(sfreq, args.channels, args.duration, args.event_rate, args.components, args.repeat,
+                                 not args.no_memory, args.stages))
+    save_results(records, args.output)
+    print('Results saved to %s' % args.output)
+
+    if args.compare is not None:
+        regressions = compare_results(args.compare, args.output, args.tolerance)
+        for stage, sfreq, name, old, new in regressions:
+            print('Regression: %s at %g Hz, %s %.4g -> %.4g (%+.0f %%)' % (stage, sfreq, name, old, new,
+                                                                           100. * (new / old - 1)))
+        if regressions:
+            sys.exit(1)
+        print('No regressions compared to %s' % args.compare)
@@ -0,0 +1,97 @@
+"""
+Created on Mon Oct 19 16:48:03 2026
+
+@author: Malte Güth
+"""
+
+# Synthetic EEG recordings for the benchmarks in this folder, so they run without any of the real data sets. A
+# recording consists of:
+#   - background activity with a 1/f spectrum (pink noise for exponent=1), independent for every channel,
+#   - alpha oscillations (10 Hz) whose amplitude waxes and wanes slowly, strongest over the last (posterior) channels,
+#   - an evoked response after every event, with a topography that depends on the event code, plus a theta burst,
+#   - two EOG channels with blinks, which also spread to the first (frontal) EEG channels,
+#   - a stim channel with events of event_codes at about event_rate events per second.
+#
+#   raw = synthetic_raw(n_channels=64, sfreq=1000., duration=120., event_rate=1.)
+#   events = mne.find_events(raw, stim_channel='STI 014')
+#
+# The same seed always gives the same recording.
+
+import numpy as np
+
+import mne
+
+
+def one_over_f(n_signals, n_times, sfreq, exponent=1., rng=None):
+    """Noise with a power spectrum proportional to 1 / f^exponent, scaled to unit standard deviation."""
+    rng = np.random.RandomState(0) if rng is None else rng
+    freqs = np.fft.rfftfreq(n_times, 1. / sfreq)
+    scaling = np.zeros_like(freqs)
+    scaling[1:] = freqs[1:] ** (-exponent / 2.)
+    noise = np.fft.irfft(np.fft.rfft(rng.randn(n_signals, n_times), axis=-1) * scaling, n_times, axis=-1)
+    return noise / noise.std(axis=-1, keepdims=True)
+
+
+def synthetic_events(n_times, sfreq, event_rate=1., event_codes=(1, 2, 3, 4), min_distance=0.5, rng=None):
+    """Events (sample, 0, code) at random times with on average event_rate events per second.
+
+    Events are at least min_distance seconds apart and at least one second from the start and end of the recording.
+    """
+    rng = np.random.RandomState(0) if rng is None else rng
+    mean_distance = max(1. / event_rate, min_distance)
+    # Exponentially distributed gaps on top of the minimum distance give an irregular, Poisson-like sequence.
+    gaps = min_distance + rng.exponential(mean_distance - min_distance, int(n_times / sfreq / mean_distance) + 1)
+    onsets = (sfreq * (1. + np.cumsum(gaps))).astype(int)
+    onsets = onsets[onsets < n_times - sfreq]
+    codes = rng.choice(event_codes, len(onsets))
+    return np.column_stack([onsets, np.zeros(len(onsets), dtype=int), codes]).astype(int)
+
+
+def synthetic_raw(n_channels=64, sfreq=1000., duration=60., event_rate=1., event_codes=(1, 2, 3, 4), exponent=1.,
+                  alpha_amplitude=1., evoked_amplitude=2., noise_level=10e-6, seed=0):
+    """A synthetic EEG recording (MNE RawArray) with n_channels EEG, two EOG and one stim channel.
+
+    Amplitudes of alpha, evoked responses and blinks are relative to the background activity, whose standard
+    deviation is noise_level (in V).
+    """
+    rng = np.random.RandomState(seed)
+    n_times = int(round(duration * sfreq))
+    times = np.arange(n_times) / sfreq
+
+    eeg = one_over_f(n_channels, n_times, sfreq, exponent, rng)
+
+    # Alpha: a 10 Hz oscillation with a slowly changing envelope, increasing from the first to the last channel.
+    envelope = 1 + one_over_f(1, n_times, sfreq, 2., rng)[0] / 2.
+    alpha = np.sin(2 * np.pi * 10. * times + rng.uniform(0, 2 * np.pi)) * envelope
+    eeg += alpha_amplitude * np.linspace(0.2, 1., n_channels)[:, np.newaxis] * alpha
+
+    # Evoked responses: a positive deflection around 300 ms and a theta burst, with one topography per event code.
+    events = synthetic_events(n_times, sfreq, event_rate, event_codes, rng=rng)
+    response_times = np.arange(int(0.8 * sfreq)) / sfreq
+    response = (np.exp(-(response_times - 0.3) ** 2 / (2 * 0.05 ** 2)) +
+                0.5 * np.sin(2 * np.pi * 6. * response_times) * np.exp(-(response_times - 0.2) ** 2 / (2 * 0.1 ** 2)))
+    topographies = dict((code, rng.randn(n_channels)) for code in event_codes)
+    for onset, _, code in events:
+        stop = min(onset + len(response), n_times)
+        eeg[:, onset:stop] += evoked_amplitude * topographies[code][:, np.newaxis] * response[:stop - onset]
+
+    # Blinks: 300 ms bumps in both EOG channels, a fraction of them in the frontal channels.
+    eog = 0.2 * one_over_f(2, n_times, sfreq, exponent, rng)
+    blink_times = np.arange(int(0.3 * sfreq)) / sfreq
+    blink = np.sin(np.pi * blink_times / 0.3) ** 2
+    for onset in rng.randint(0, max(n_times - len(blink), 1), int(duration / 4.)):
+        eog[:, onset:onset + len(blink)] += 10 * blink
+    spread = np.zeros(n_channels)
+    spread[:min(4, n_channels)] = 0.5
+    eeg += spread[:, np.newaxis] * eog[0]
+
+    stim = np.zeros((1, n_times))
+    pulse = max(int(0.005 * sfreq), 1)
+    for onset, _, code in events:
+        stim[0, onset:onset + pulse] = code
+
+    ch_names = ['EEG%03d' % (idx + 1) for idx in range(n_channels)] + ['VEOG', 'HEOG', 'STI 014']
+    ch_types = ['eeg'] * n_channels + ['eog', 'eog', 'stim']
+    info = mne.create_info(ch_names, sfreq, ch_types)
+    data = np.concatenate([noise_level * eeg, noise_level * eog, stim])
+    return mne.io.RawArray(data, info, verbose=False)
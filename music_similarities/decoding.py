@@ -0,0 +1,109 @@
+"""
+Created on Sun Oct 18 14:07:33 2026
+
+@author: Malte Güth
+"""
+
+# Time-resolved decoding of the music genres. representational_similarity_analysis.py decodes a single time window of
+# the epochs (e.g. 0 to 500 ms after the music onset), and every other window would need another run of the script.
+# Here, the epochs are read once and the average amplitude in each of many sliding windows is computed from a
+# cumulative sum over time, so every window costs the same, no matter how long it is. The classifier is then fitted
+# for every window and cross-validation fold, with all (window x fold) fits distributed across n_jobs processes.
+# The result is a confusion matrix of ROC-AUC scores for every window, i.e. the decoding performance over time.
+
+import numpy as np
+from scipy.stats import rankdata
+
+from joblib import Parallel, delayed
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+
+def make_classifier(C=1):
+    # The classifier of representational_similarity_analysis.py.
+    return make_pipeline(StandardScaler(), LogisticRegression(C=C, solver='lbfgs'))
+
+
+def sliding_windows(tmin, tmax, length, step):
+    """(start, stop) times in seconds of windows of the given length, moved by step from tmin until tmax."""
+    starts = np.arange(tmin, tmax - length + step / 2., step)
+    return [(float(start), float(start + length)) for start in starts]
+
+
+def window_means(data, times, windows):
+    """Average of data (n_epochs x n_channels x n_times) within each window.
+
+    Returns an array of n_windows x n_epochs x n_channels. The windows include their start and exclude their stop,
+    like epochs.copy().crop(start, stop) does apart from the last sample.
+    """
+    times = np.asarray(times)
+    cumulative = np.concatenate([np.zeros(data.shape[:-1] + (1,)), np.cumsum(data, axis=-1)], axis=-1)
+    means = np.empty((len(windows),) + data.shape[:-1])
+    for wi, (start, stop) in enumerate(windows):
+        first, last = np.searchsorted(times, [start, stop])
+        if last <= first:
+            raise ValueError('The window from %s to %s s contains no samples.' % (start, stop))
+        means[wi] = (cumulative[..., last] - cumulative[..., first]) / (last - first)
+    return means
+
+
+def _fit_predict(X, y, train, test, C):
+    clf = make_classifier(C)
+    clf.fit(X[train], y[train])
+    return clf.predict_proba(X[test])
+
+
+def confusion_auc(y, y_pred, classes, symmetric=True):
+    """Matrix of ROC-AUC scores: row ii, column jj scores how well y_pred[:, jj] picks out the trials of classes[ii].
+
+    The ROC-AUC equals the Mann-Whitney U statistic of the predictions of the trials in and outside the class,
+    divided by the number of pairs of such trials. Each column of y_pred is ranked once and the rank sums of all
+    classes in all columns are computed with one matrix product, instead of calling roc_auc_score for every pair.
+    y and y_pred may have leading dimensions (e.g. windows or permutations): y of shape (..., n_epochs) and y_pred
+    of shape (..., n_epochs, n_classes) give matrices of shape (..., n_classes, n_classes).
+
+    With symmetric=True, only the upper triangle is kept and mirrored, as in representational_similarity_analysis.py.
+    """
+    y = np.asarray(y)
+    classes = np.asarray(sorted(classes))
+    # Ties get their average rank, which scores tied pairs with 0.5 like roc_auc_score does.
+    ranks = rankdata(y_pred, axis=-2)
+
+    members = (y[..., np.newaxis] == classes).astype(float)
+    n_pos = members.sum(axis=-2)[..., np.newaxis]
+    n_neg = y.shape[-1] - n_pos
+    rank_sums = np.matmul(np.swapaxes(members, -1, -2), ranks)
+    confusion = (rank_sums - n_pos * (n_pos + 1) / 2.) / (n_pos * n_neg)
+
+    if symmetric:
+        upper = np.triu(confusion)
+        confusion = upper + np.swapaxes(np.triu(confusion, 1), -1, -2)
+    return confusion
+
+
+def decode_windows(data, times, y, windows, n_splits=5, C=1, n_jobs=1, random_state=0):
+    """Cross-validated decoding of y from the average amplitude in each window.
+
+    data are the epochs as returned by epochs.get_data(), y holds one label per epoch. Returns the ROC-AUC confusion
+    matrices with the shape n_windows x n_classes x n_classes and the probabilistic predictions of all trials
+    (n_windows x n_epochs x n_classes).
+    """
+    y = np.asarray(y)
+    classes = np.unique(y)
+    X = window_means(data, times, windows)
+
+    # The folds are the same for all windows.
+    cv = StratifiedKFold(n_splits=n_splits, random_state=random_state, shuffle=True)
+    folds = list(cv.split(X[0], y))
+
+    probas = Parallel(n_jobs=n_jobs)(delayed(_fit_predict)(X[wi], y, train, test, C)
+                                     for wi in range(len(windows)) for train, test in folds)
+
+    y_pred = np.zeros((len(windows), len(y), len(classes)))
+    for job, proba in enumerate(probas):
+        wi, fold = divmod(job, n_splits)
+        y_pred[wi, folds[fold][1]] = proba
+
+    return confusion_auc(y, y_pred, classes), y_pred
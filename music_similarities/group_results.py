@@ -0,0 +1,102 @@
+"""
+Created on Sun Oct 18 17:20:56 2026
+
+@author: Malte Güth
+"""
+
+# Collecting the results of all subjects (e.g. their confusion matrices) in one place. The array for the whole group
+# is created once with one row per subject and lives in a .npy file on disk, which is memory-mapped, so it can grow
+# beyond the available memory. Every subject's result is written to its own row as soon as it is computed, and a small
+# .json file next to it notes which subjects are finished. If the analysis crashes halfway, create the GroupResults
+# with the same file again and skip all subjects for which is_done returns True.
+
+import json
+import os
+
+import numpy as np
+
+
+class GroupResults(object):
+    """Results of the same shape for a list of subjects, stored in a memory-mapped .npy file.
+
+    subjects is the list of subject names, shape the shape of one subject's result. labels optionally names the
+    entries along the last axes (e.g. the genres of a confusion matrix), so that they can be looked up by name.
+    """
+
+    def __init__(self, filename, subjects, shape, labels=None, dtype=np.float64):
+        self.filename = filename
+        self.state_file = os.path.splitext(filename)[0] + '-done.json'
+        self.subjects = list(subjects)
+        self.labels = list(labels) if labels is not None else None
+        shape = (len(self.subjects),) + tuple(shape)
+
+        if os.path.isfile(filename) and os.path.isfile(self.state_file):
+            # Resume an earlier run.
+            self.data = np.load(filename, mmap_mode='r+')
+            with open(self.state_file) as fid:
+                state = json.load(fid)
+            if self.data.shape != shape or state['subjects'] != self.subjects:
+                raise ValueError('%s holds results for other subjects or of another shape. Delete it (and %s) or '
+                                 'use another file name.' % (filename, self.state_file))
+            self.done = set(state['done'])
+        else:
+            self.data = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape)
+            self.done = set()
+            self._save_state()
+
+    def _save_state(self):
+        with open(self.state_file + '.tmp', 'w') as fid:
+            json.dump(dict(subjects=self.subjects, done=sorted(self.done)), fid)
+        os.replace(self.state_file + '.tmp', self.state_file)
+
+    def is_done(self, subject):
+        return subject in self.done
+
+    @property
+    def pending(self):
+        return [subject for subject in self.subjects if subject not in self.done]
+
+    def __setitem__(self, subject, result):
+        self.data[self.subjects.index(subject)] = result
+        self.data.flush()
+        # Only mark the subject as done once its result is safely on disk.
+        self.done.add(subject)
+        self._save_state()
+
+    def __getitem__(self, subject):
+        return self.data[self.subjects.index(subject)]
+
+    def label_index(self, label):
+        return self.labels.index(label)
+
+    def _moments(self, block_size=16):
+        # Number, sum and sum of squared deviations from the mean over all finished subjects, reading block_size
+        # subjects at a time. The squared deviations of each block are merged with those of the blocks before (as in
+        # TFRAccumulator), since the difference of the sum of squares and the squared sum cancels badly.
+        rows = sorted(self.subjects.index(subject) for subject in self.done)
+        total = np.zeros(self.data.shape[1:])
+        m2 = np.zeros(self.data.shape[1:])
+        for start in range(0, len(rows), block_size):
+            block = np.asarray(self.data[rows[start:start + block_size]], dtype=np.float64)
+            block_mean = block.mean(axis=0)
+            if start:
+                delta = block_mean - total / start
+                m2 += delta ** 2 * (start * len(block) / float(start + len(block)))
+            m2 += ((block - block_mean) ** 2).sum(axis=0)
+            total += block.sum(axis=0)
+        return len(rows), total, m2
+
+    def mean(self):
+        """Average over all finished subjects."""
+        n, total, m2 = self._moments()
+        if n == 0:
+            raise ValueError('No subject is finished yet, so there is no average.')
+        return total / n
+
+    def sem(self):
+        """Standard error of the mean over all finished subjects."""
+        n, total, m2 = self._moments()
+        if n < 2:
+            raise ValueError('The standard error needs at least two finished subjects, but %d %s finished.'
+                             % (n, 'is' if n == 1 else 'are'))
+        return np.sqrt(m2 / (n - 1) / n)
@@ -0,0 +1,153 @@
+"""
+Created on Sun Oct 18 19:04:37 2026
+
+@author: Malte Güth
+"""
+
+# Multitaper power spectra of all epochs of all subjects as features for the decoding. psd_multitaper computes the
+# DPSS tapers again for every call and holds the tapered spectra of all epochs, channels and tapers in memory at once.
+# Here, the tapers are computed once for each combination of epoch length and bandwidth and kept in a cache, and the
+# tapered FFTs are computed for a batch of epochs at a time (all channels and tapers of the batch in one call of rfft).
+# The spectra are written straight into a float32 .npy file on disk, with a small .json file next to it that holds the
+# frequencies, channel names and events:
+#
+#   epochs = mne.read_epochs('./epochs/sub-03-reordered-epo.fif')
+#   save_features(epochs, './epochs/sub-03-psd.npy', tmin=0, tmax=1, fmin=1, fmax=60)
+#   psds, meta = load_features('./epochs/sub-03-psd.npy')
+#
+# load_features opens the spectra memory-mapped, so the decoding can use them without reading all subjects into
+# memory or computing the spectra again. The spectra are the same as those of psd_multitaper with its default
+# settings (normalization='length', low_bias=True, adaptive=False).
+
+import functools
+import json
+import os
+
+import numpy as np
+from scipy.signal.windows import dpss
+
+import mne
+
+
+@functools.lru_cache(maxsize=16)
+def dpss_tapers(n_times, half_nbw, low_bias=True):
+    """DPSS tapers (n_tapers x n_times) and their weights for epochs of n_times samples, computed once and cached.
+
+    half_nbw is the half bandwidth in frequency bins. With low_bias=True, only tapers with an eigenvalue (spectral
+    concentration) above 0.9 are kept, like psd_multitaper does.
+    """
+    tapers, eigvals = dpss(n_times, half_nbw, int(2 * half_nbw), sym=False, return_ratios=True)
+    if low_bias:
+        keep = eigvals > 0.9
+        if not keep.any():
+            keep = [np.argmax(eigvals)]
+        tapers, eigvals = tapers[keep], eigvals[keep]
+    weights = np.sqrt(eigvals)
+    # The cached arrays are shared by all callers and must not be changed.
+    tapers.flags.writeable = False
+    weights.flags.writeable = False
+    return tapers, weights
+
+
+def half_bandwidth(n_times, sfreq, bandwidth=None):
+    # The bandwidth in Hz as half bandwidth in frequency bins; psd_multitaper uses 4 bins without a bandwidth.
+    return 4. if bandwidth is None else bandwidth * n_times / (2. * sfreq)
+
+
+def psd_batched(data, sfreq, fmin=0, fmax=np.inf, bandwidth=None, normalization='length', batch_size=32,
+                out=None):
+    """Multitaper power spectra of data (n_epochs x n_channels x n_times), batch_size epochs at a time.
+
+    Returns the spectra (n_epochs x n_channels x n_freqs) and the frequencies. If out is given (e.g. a memory-mapped
+    array), the spectra are written into it instead of a new array.
+    """
+    n_epochs, n_channels, n_times = data.shape
+    tapers, weights = dpss_tapers(n_times, half_bandwidth(n_times, sfreq, bandwidth))
+
+    freqs = np.fft.rfftfreq(n_times, 1. / sfreq)
+    freq_mask = (freqs >= fmin) & (freqs <= fmax)
+
+    # Taper weights and the scaling of psd_multitaper in one factor per taper. The DC and Nyquist bins are only
+    # counted once in a one-sided spectrum, so their power is halved.
+    scale = (weights ** 2 * 2. / (weights ** 2).sum())[:, np.newaxis]
+    edges = np.ones(len(freqs))
+    edges[0] = 0.5
+    if n_times % 2 == 0:
+        edges[-1] = 0.5
+    scale = (scale * edges)[:, freq_mask]
+    if normalization == 'full':
+        scale = scale / sfreq
+
+    if out is None:
+        out = np.empty((n_epochs, n_channels, freq_mask.sum()))
+    for start in range(0, n_epochs, batch_size):
+        batch = np.asarray(data[start:start + batch_size], dtype=np.float64)
+        batch = batch - batch.mean(axis=-1, keepdims=True)
+        # All epochs, channels and tapers of the batch in one FFT: n_batch x n_channels x n_tapers x n_freqs.
+        spectra = np.fft.rfft(batch[:, :, np.newaxis, :] * tapers, axis=-1)[..., freq_mask]
+        out[start:start + len(batch)] = (np.abs(spectra) ** 2 * scale).sum(axis=-2)
+    return out, freqs[freq_mask]
+
+
+def _meta_file(filename):
+    return os.path.splitext(filename)[0] + '.json'
+
+
+def save_features(epochs, filename, tmin=None, tmax=None, fmin=0, fmax=np.inf, picks=None, bandwidth=None,
+                  batch_size=32):
+    """Compute the multitaper spectra of epochs between tmin and tmax and store them in filename (.npy) as float32.
+
+    picks defaults to the EEG channels. Returns the memory-mapped spectra and their frequencies.
+    """
+    if picks is None:
+        picks = mne.pick_types(epochs.info, meg=False, eeg=True)
+    sfreq = epochs.info['sfreq']
+
+    # The samples between tmin and tmax, both included, as in psd_multitaper.
+    samples = np.round(epochs.times * sfreq)
+    time_mask = np.ones(len(samples), dtype=bool)
+    if tmin is not None:
+        time_mask &= samples >= np.round(tmin * sfreq)
+    if tmax is not None:
+        time_mask &= samples <= np.round(tmax * sfreq)
+    data = epochs.get_data()[:, picks][..., time_mask]
+
+    # Remove the .json file of an earlier run first, so its spectra don't count as complete while they are replaced.
+    if os.path.isfile(_meta_file(filename)):
+        os.remove(_meta_file(filename))
+    freqs = np.fft.rfftfreq(data.shape[-1], 1. / sfreq)
+    n_freqs = int(((freqs >= fmin) & (freqs <= fmax)).sum())
+    psds = np.lib.format.open_memmap(filename + '.tmp.npy', mode='w+', dtype=np.float32,
+                                     shape=(len(data), len(picks), n_freqs))
+    psds, freqs = psd_batched(data, sfreq, fmin, fmax, bandwidth, batch_size=batch_size, out=psds)
+    psds.flush()
+    del psds
+    os.replace(filename + '.tmp.npy', filename)
+
+    meta = dict(freqs=freqs.tolist(), ch_names=[epochs.ch_names[pick] for pick in picks],
+                events=epochs.events.tolist(), event_id=epochs.event_id, sfreq=sfreq,
+                tmin=float(epochs.times[time_mask][0]), tmax=float(epochs.times[time_mask][-1]),
+                bandwidth=bandwidth)
+    # The .json file is written last, so a crash never leaves spectra behind that look complete.
+    with open(_meta_file(filename) + '.tmp', 'w') as fid:
+        json.dump(meta, fid)
+    os.replace(_meta_file(filename) + '.tmp', _meta_file(filename))
+    return load_features(filename)[0], freqs
+
+
+def load_features(filename):
+    """Open spectra stored by save_features without reading them into memory.
+
+    Returns the spectra (n_epochs x n_channels x n_freqs) and a dict with the frequencies ('freqs'), channel names
+    ('ch_names'), events ('events') and the settings used.
+    """
+    with open(_meta_file(filename)) as fid:
+        meta = json.load(fid)
+    meta['freqs'] = np.array(meta['freqs'])
+    meta['events'] = np.array(meta['events'], dtype=int).reshape(-1, 3)
+    return np.load(filename, mmap_mode='r'), meta
+
+
+def has_features(filename):
+    """Whether complete spectra are stored in filename."""
+    return os.path.isfile(filename) and os.path.isfile(_meta_file(filename))
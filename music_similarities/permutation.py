@@ -0,0 +1,134 @@
+"""
+Created on Sun Oct 18 15:48:12 2026
+
+@author: Malte Güth
+"""
+
+# Permutation tests for the decoding in decoding.py. To see whether an ROC-AUC score in the genre confusion matrix is
+# higher than expected by chance, the genre labels are shuffled many times and the whole cross-validated decoding is
+# repeated for each shuffle. The scores of the shuffled labels form the null distribution.
+#
+# Everything that does not depend on the labels is done only once: the cross-validation folds are fixed and the
+# features of every fold are standardized before the shuffling starts, so each permutation only fits the logistic
+# regressions. The permutations are split into chunks that run in parallel (n_jobs). Every chunk gets its own random
+# seed derived from a single seed, so the results are the same no matter how many jobs are used. Instead of keeping
+# all permuted confusion matrices, each chunk only returns
+#   - how often each cell of the permuted matrices reached the observed score (for uncorrected p-values),
+#   - the largest score of each permuted matrix (max-statistic, for p-values corrected for all cells and windows),
+#   - the largest cluster mass of each permutation. A cluster is a run of neighbouring time windows in which a cell
+#     scores above a threshold (by default chance, 0.5), and its mass is the summed score above the threshold.
+
+import numpy as np
+
+from joblib import Parallel, delayed
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+
+from decoding import confusion_auc
+
+
+def prepare_folds(X, y, n_splits=5, random_state=0):
+    """Split the trials into folds once and standardize the features of every window and fold.
+
+    X has the shape n_windows x n_epochs x n_features (e.g. from decoding.window_means). Returns a list with one
+    entry per window, each a list of (train, test, standardized train features, standardized test features).
+    """
+    cv = StratifiedKFold(n_splits=n_splits, random_state=random_state, shuffle=True)
+    folds = list(cv.split(X[0], y))
+    prepared = []
+    for X_window in X:
+        prepared.append([])
+        for train, test in folds:
+            scaler = StandardScaler().fit(X_window[train])
+            prepared[-1].append((train, test, scaler.transform(X_window[train]), scaler.transform(X_window[test])))
+    return prepared
+
+
+def _predict(prepared, y, classes, C):
+    # Cross-validated probabilistic predictions for every window with the labels y.
+    y_pred = np.zeros((len(prepared), len(y), len(classes)))
+    for wi, folds in enumerate(prepared):
+        for train, test, X_train, X_test in folds:
+            clf = LogisticRegression(C=C, solver='lbfgs').fit(X_train, y[train])
+            columns = np.searchsorted(classes, clf.classes_)
+            y_pred[wi, test[:, np.newaxis], columns] = clf.predict_proba(X_test)
+    return y_pred
+
+
+def cluster_masses(scores, threshold):
+    """Mass of the cluster each score belongs to, with clusters running along the first axis (the windows).
+
+    Scores at or below threshold get a mass of 0.
+    """
+    excess = np.where(scores > threshold, scores - threshold, 0.)
+    masses = np.zeros_like(excess)
+    running = np.zeros(scores.shape[1:])
+    for wi in range(len(scores)):
+        running = np.where(excess[wi] > 0, running + excess[wi], 0.)
+        masses[wi] = running
+    # Going backwards, every window of a cluster gets the mass of the cluster's last window.
+    for wi in range(len(scores) - 2, -1, -1):
+        masses[wi] = np.where((masses[wi] > 0) & (masses[wi + 1] > 0), masses[wi + 1], masses[wi])
+    return masses
+
+
+def _null_chunk(prepared, y, classes, C, observed, threshold, seed, n_permutations):
+    rng = np.random.default_rng(seed)
+    exceed = np.zeros(observed.shape, dtype=int)
+    max_scores = np.empty(n_permutations)
+    max_masses = np.empty(n_permutations)
+    for pi in range(n_permutations):
+        y_perm = rng.permutation(y)
+        scores = confusion_auc(y_perm, _predict(prepared, y_perm, classes, C), classes)
+        exceed += scores >= observed
+        max_scores[pi] = scores.max()
+        max_masses[pi] = cluster_masses(scores, threshold).max()
+    return exceed, max_scores, max_masses
+
+
+def permutation_test(X, y, n_permutations=1000, n_splits=5, C=1, threshold=0.5, n_jobs=1, chunk_size=50,
+                     seed=0, random_state=0):
+    """Permutation test of the cross-validated ROC-AUC confusion matrices of every window.
+
+    X has the shape n_windows x n_epochs x n_features (or n_epochs x n_features for a single window), y holds one
+    label per epoch. Returns a dict with the observed matrices ('observed', n_windows x n_classes x n_classes),
+    uncorrected p-values for every cell ('p_values'), p-values corrected with the max-statistic ('p_max') and p-values
+    of the cluster each cell belongs to ('p_cluster', 1 outside of clusters).
+    """
+    X = np.asarray(X)
+    if X.ndim == 2:
+        X = X[np.newaxis]
+    y = np.asarray(y)
+    classes = np.unique(y)
+
+    prepared = prepare_folds(X, y, n_splits, random_state)
+    observed = confusion_auc(y, _predict(prepared, y, classes, C), classes)
+
+    chunks = [chunk_size] * (n_permutations // chunk_size)
+    if n_permutations % chunk_size:
+        chunks.append(n_permutations % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    results = Parallel(n_jobs=n_jobs)(delayed(_null_chunk)(prepared, y, classes, C, observed, threshold, chunk_seed,
+                                                           n_chunk)
+                                      for chunk_seed, n_chunk in zip(seeds, chunks))
+
+    # Add up the results of all chunks.
+    exceed = np.zeros(observed.shape, dtype=int)
+    max_scores, max_masses = [], []
+    for chunk_exceed, chunk_scores, chunk_masses in results:
+        exceed += chunk_exceed
+        max_scores.append(chunk_scores)
+        max_masses.append(chunk_masses)
+    max_scores = np.concatenate(max_scores)
+    max_masses = np.concatenate(max_masses)
+
+    # The observed labels count as one of the permutations, so p-values are never 0.
+    masses = cluster_masses(observed, threshold)
+    p_cluster = (1 + (max_masses >= masses[..., np.newaxis]).sum(axis=-1)) / (n_permutations + 1.)
+    return dict(observed=observed,
+                p_values=(exceed + 1.) / (n_permutations + 1.),
+                p_max=(1 + (max_scores >= observed[..., np.newaxis]).sum(axis=-1)) / (n_permutations + 1.),
+                p_cluster=np.where(masses > 0, p_cluster, 1.),
+                max_scores=max_scores, max_masses=max_masses)
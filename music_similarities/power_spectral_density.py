@@ -4,19 +4,32 @@ Created on Sat Aug 25 14:50:05 2018
 @author: Malte Gueth
 """
 
+import os
+import glob
+
 import mne
-from mne.time_frequency import psd_multitaper
 
-# Load epoched data segments and compute power spectral density for all genres
+from multitaper import has_features, save_features
+
+# Load epoched data segments of all subjects and compute power spectral density for all genres
 # as alternative input for the rsa script
-file = './epochs/sub-03-reordered-epo.fif'
-epochs = mne.read_epochs(file)
+path = './epochs/'
+files = sorted(glob.glob(os.path.join(path, '*-reordered-epo.fif')))
 
-picks = mne.pick_types(epochs.info, eeg=True)
 tmin, tmax = 0, 1 # Pick time window within each epoch
 fmin, fmax = 1, 60 # Pick frequency range
 
-# Besides frequencies, the function returns an array of 320 epochs x 64 electrodes x 59 frequencies
-psds, freqs = psd_multitaper(epochs, tmin=tmin, tmax=tmax,
-                             fmin=fmin, fmax=fmax, picks=picks)
-                             
+for file in files:
+    out_file = file[:-len('-reordered-epo.fif')] + '-psd.npy'
+    # Subjects whose spectra are already stored are skipped, delete their -psd.npy file to compute them again
+    if has_features(out_file):
+        continue
+
+    epochs = mne.read_epochs(file)
+    picks = mne.pick_types(epochs.info, eeg=True)
+
+    # Besides frequencies, this stores an array of 320 epochs x 64 electrodes x 59 frequencies (as float32) in
+    # out_file, the same spectra psd_multitaper would give. The DPSS tapers are only computed for the first subject
+    # and reused for all others, since the epochs have the same length (see multitaper.py).
+    psds, freqs = save_features(epochs, out_file, tmin=tmin, tmax=tmax,
+                                fmin=fmin, fmax=fmax, picks=picks)
@@ -1,24 +1,53 @@
 import os
 import glob
+import sys
 
 import numpy as np
 import matplotlib.pyplot as plt
 
-from sklearn.model_selection import StratifiedKFold
-from sklearn.pipeline import make_pipeline
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import roc_auc_score
-
 import mne
 
-# Create a classifier
-clf = make_pipeline(StandardScaler(),
-                    LogisticRegression(C=1, solver='lbfgs'))
+from decoding import decode_windows, sliding_windows, window_means
+from group_results import GroupResults
+from permutation import permutation_test
+
+# The event recoding is shared with the scripts in the preprocessing folder.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'preprocessing'))
+from event_recoding import recode_events
+
+# Trigger codes of the genres in alphabetical order and the integers they are assigned to in event_id below.
+genre_codes = {1: 1, 2: 6, 3: 7, 4: 11, 5: 12, 6: 13, 7: 16, 8: 3, 9: 17, 10: 8,
+               11: 5, 12: 2, 13: 18, 14: 9, 15: 19, 16: 4, 17: 10, 18: 20, 19: 14, 20: 15}
+
+event_id = {'alternative': 1, 'punk': 2, 'heavymetal': 3,
+            'rocknroll': 4, 'psychedelic': 5, 'baroque': 6,
+            'classic': 7, 'modernclassic': 8, 'renaissance': 9,
+            'romantic': 10, 'deephouse': 11, 'drumandbass': 12,
+            'dubstep': 13, 'techno': 14, 'trance': 15, 'funk': 16,
+            'hiphop': 17, 'reggae': 18, 'rnb': 19, 'soul': 20
+            }
+classes = sorted(event_id.values())
+genres = sorted(event_id, key=event_id.get)
+
+# Decode the genres in sliding windows of 500 ms that are moved in steps of 250 ms across the whole epoch
+# (500 ms before until 6000 ms after the music onset).
+windows = sliding_windows(-0.5, 6, 0.5, 0.25)
+onset_window = np.argmin([abs(start) for start, stop in windows])
 
 # Load cleaned raw data and start epoching them as required
 path = './rawdata/'  
-for file in glob.glob(os.path.join(path, '*ICA-raw.fif')):
+files = sorted(glob.glob(os.path.join(path, '*ICA-raw.fif')))
+subjects = [os.path.basename(file)[:-len('-ICA-raw.fif')] for file in files]
+
+# The confusion matrices of all subjects and windows are collected in one array on disk, one row per subject.
+# If the script crashed before, the subjects that are already finished are skipped.
+all_confusion = GroupResults('./epochs/all_confusion.npy', subjects, (len(windows), len(classes), len(classes)),
+                             labels=genres)
+
+for file, subject in zip(files, subjects):
+
+    if all_confusion.is_done(subject):
+        continue
 
     filepath, filename = os.path.split(file)
     filename, ext = os.path.splitext(filename)
@@ -30,60 +59,8 @@ for file in glob.glob(os.path.join(path, '*ICA-raw.fif')):
     
     # Recode genres that were sorted alphabetically to the desired integer assignments,
     # as noted in the event_id dict
-    new_events = events[:,2]
-    
-    for i in range(new_events.size):
-        
-        if (new_events[i] == 1):
-            new_events[i] = 1
-        elif (new_events[i] == 2):
-              new_events[i] = 6
-        elif (new_events[i] == 3):
-              new_events[i] = 7
-        elif (new_events[i] == 4):
-              new_events[i] = 11
-        elif (new_events[i] == 5):
-              new_events[i] = 12
-        elif (new_events[i] == 6):
-              new_events[i] = 13
-        elif (new_events[i] == 7):
-              new_events[i] = 16
-        elif (new_events[i] == 8):
-              new_events[i] = 3
-        elif (new_events[i] == 9):
-              new_events[i] = 17
-        elif (new_events[i] == 10):
-              new_events[i] = 8
-        elif (new_events[i] == 11):
-              new_events[i] = 5
-        elif (new_events[i] == 12):
-              new_events[i] = 2
-        elif (new_events[i] == 13):
-              new_events[i] = 18
-        elif (new_events[i] == 14):
-              new_events[i] = 9
-        elif (new_events[i] == 15):
-              new_events[i] = 19
-        elif (new_events[i] == 16):
-              new_events[i] = 4
-        elif (new_events[i] == 17):
-              new_events[i] = 10
-        elif (new_events[i] == 18):
-              new_events[i] = 20
-        elif (new_events[i] == 19):
-              new_events[i] = 14
-        elif (new_events[i] == 20):
-              new_events[i] = 15
-
-    events[:,2] = new_events
-    event_id = {'alternative': 1, 'punk': 2, 'heavymetal': 3,
-                'rocknroll': 4, 'psychedelic': 5, 'baroque': 6,
-                'classic': 7, 'modernclassic': 8, 'renaissance': 9,
-                'romantic': 10, 'deephouse': 11, 'drumandbass': 12,
-                'dubstep': 13, 'techno': 14, 'trance': 15, 'funk': 16,
-                'hiphop': 17, 'reggae': 18, 'rnb': 19, 'soul': 20
-                } 
-    
+    events = recode_events(events, genre_codes, unmapped='keep')
+
     # Epoch the data with 500 ms before the music onset and 6000 ms after it
     epochs = mne.Epochs(raw, events=events, event_id=event_id, tmin=-0.5, tmax=6,
                         baseline=(-0.5, 0), picks=picks, preload=True)        
@@ -92,45 +69,37 @@ for file in glob.glob(os.path.join(path, '*ICA-raw.fif')):
     # Save the epochs with re-assigned trigger codes
     epochs.save('./epochs/' + filename[:-8] + '-reordered-epo.fif')
 
-    # Crop the epochs to time windows you want to analyze separately
-    X = epochs.copy().crop(0, 0.5).get_data().mean(axis=2)
-    #X = epochs.copy().crop(2, 2.5).get_data().mean(axis=2)
-    #X = epochs.copy().crop(4, 4.5).get_data().mean(axis=2)
-
+    # Instead of cropping the epochs to single time windows you want to analyze separately (e.g. 0 to 500 ms,
+    # 2000 to 2500 ms or 4000 to 4500 ms), decode the genres in all sliding windows defined above. The fits for
+    # all windows and cross-validation folds are distributed across all CPU cores (n_jobs=-1).
     y = epochs.events[:, 2]
 
-    classes = set(y)
-    cv = StratifiedKFold(n_splits=5, random_state=0, shuffle=True)
-
-
-    # Compute confusion matrix for each cross-validation fold
-    y_pred = np.zeros((len(y), len(classes)))
-    for train, test in cv.split(X, y):
-        # Fit
-        clf.fit(X[train], y[train])
-        # Probabilistic prediction (necessary for ROC-AUC scoring metric)
-        y_pred[test] = clf.predict_proba(X[test])
-
-    confusion = np.zeros((len(classes), len(classes)))
-    for ii, train_class in enumerate(classes):
-        for jj in range(ii, len(classes)):
-            confusion[ii, jj] = roc_auc_score(y == train_class, y_pred[:, jj])
-            confusion[jj, ii] = confusion[ii, jj]
-            
-    # Add all confusion matrices for all subjects together and average them
-    if file == './rawdata/sub-02-ICA-raw.fif':
-        all_confusion = confusion
-    else:
-        all_confusion = np.append(all_confusion, confusion, axis=0)
-        
-mean_confusion = all_confusion.mean(0)
-labels = {'alternative': 0, 'punk': 1, 'heavymetal': 2,
-          'rocknroll': 3, 'psychedelic': 4, 'baroque': 5,
-          'classic': 6, 'modernclassic': 7, 'renaissance': 8,
-          'romantic': 9, 'deephouse': 10, 'drumandbass': 11,
-          'dubstep': 12, 'techno': 13, 'trance': 14, 'funk': 15,
-          'hiphop': 16, 'reggae': 17, 'rnb': 18, 'soul': 19
-         } 
+    # Compute a confusion matrix of ROC-AUC scores for each window. The diagonal of each matrix shows how well each
+    # genre is decoded in that window (see the plot of the group at the end).
+    data = epochs.get_data()
+    confusion_time, _ = decode_windows(data, epochs.times, y, windows, n_splits=5, n_jobs=-1)
+    np.save('./epochs/' + filename[:-8] + '-auc-time.npy', confusion_time)
+
+    # Test every cell of the confusion matrix of the window starting at the music onset against chance by shuffling
+    # the genre labels 1000 times and repeating the decoding (see permutation.py). p_max is corrected for the number
+    # of cells with the max-statistic.
+    permutations = permutation_test(window_means(data, epochs.times, [windows[onset_window]]), y,
+                                    n_permutations=1000, n_splits=5, n_jobs=-1, seed=0)
+    np.save('./epochs/' + filename[:-8] + '-p-values.npy', permutations['p_max'][0])
+
+    # The genres can also be decoded from the power spectra stored by power_spectral_density.py, which are read
+    # from disk instead of being computed again. Frequency bands take the place of the time windows:
+    #   psds, meta = load_features('./epochs/' + filename[:-8] + '-psd.npy')   (from multitaper import load_features)
+    #   bands = [(1, 4), (4, 8), (8, 13), (13, 30), (30, 60)]
+    #   confusion_bands, _ = decode_windows(psds, meta['freqs'], meta['events'][:, 2], bands, n_jobs=-1)
+
+    # Add the confusion matrices of this subject to those of the group.
+    all_confusion[subject] = confusion_time
+
+# Average the confusion matrices over all subjects (with their standard error) and pick the window at the music onset.
+mean_confusion = all_confusion.mean()[onset_window]
+sem_confusion = all_confusion.sem()[onset_window]
+labels = genres
 
 fig, ax = plt.subplots(1)
 im = ax.matshow(mean_confusion, cmap='RdBu_r', clim=[0.3, 0.7])
@@ -141,3 +110,15 @@ ax.set_xticklabels(labels, rotation=70, ha='left')
 plt.colorbar(im)
 plt.tight_layout()
 plt.show()
+
+# The diagonals of the confusion matrices of all windows show how well each genre is decoded over time.
+auc_time = np.diagonal(all_confusion.mean(), axis1=1, axis2=2)
+window_centers = [(start + stop) / 2. for start, stop in windows]
+fig, ax = plt.subplots(1)
+ax.plot(window_centers, auc_time)
+ax.axhline(0.5, color='k', linestyle='--')
+ax.set_xlabel('Time (s)')
+ax.set_ylabel('ROC-AUC')
+ax.legend(labels)
+plt.tight_layout()
+plt.show()
@@ -57,16 +57,48 @@ event_id = {'Sync': 128, 'response_or_something': 1}
 events_plot = mne.viz.plot_events(events, sfreq, raw.first_samp)
 events_plot.savefig('./event_channel.pdf', bbox='tight')
 
+# If you want to get rid of the 'Sync' events altogether, e.g. before counting your responses, you can
+# keep only the codes you name with recode_events from the preprocessing folder. Every event with a code that
+# is not in the dict (here, all 'Sync' events) is dropped from the array.
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'preprocessing'))
+from event_recoding import recode_events
+
+events_responses = recode_events(events, {1: 1}, unmapped='drop')
+print('%d responses out of %d events' % (len(events_responses), len(events)))
+
 # If you enter the following, your raw data would be epoched. Epochs would be locked to
 # 'Sync' and 'response', because these are the only ones I specified in 'event_id'.
 # The temporal range of epochs is determined with the 'tmin' and 'tmax' parameters in seconds.
 # 'baseline' refers to a baseline correction and picks limits epoching to the channels 
 # selected as 'True' in the list of logicals 'picks'. Hence, respiratory responses and
-# electrodermal responses would be epoched.
-epochs = mne.Epochs(raw, events=events, event_id=event_id, tmin=-1, tmax=5,
-                    baseline=None, picks=picks, preload=True)
+# electrodermal responses would be epoched. The epoching parameters are kept in a dict, so that the stage cache
+# below notes exactly the ones that were used.
+epoch_params = dict(event_id=event_id, tmin=-1, tmax=5, baseline=None)
+epochs = mne.Epochs(raw, events=events, picks=picks, preload=True, **epoch_params)
 epochs.save('./music_stress-epo.fif')
 
+# The epochs are cut in a few seconds, so this script doesn't skip anything, but it notes the recording and the
+# epoching parameters in the stage cache from the preprocessing folder (see stage_cache.py). Analyses that read the
+# epochs through the cache are then run again when the recording or the parameters change.
+from stage_cache import StageCache
+
+StageCache().record('epoch', epoch_params, [file], './music_stress-epo.fif')
+
 # If required, you can write the data of each epoch into a numpy array with the dimensions 
 # epochs, channels, and sample points.
 data = epochs['response_or_something'].get_data()
+
+# The same epochs can also be cut while the data are recorded, e.g. to watch the responses during the session, with
+# streaming.py in this folder. To try it before the session, ReplaySource plays this recording back in blocks of
+# 100 ms (here ten times faster than it was recorded), and the epochs come out as soon as their last sample arrived:
+#
+#   from streaming import ReplaySource, StreamingEpocher
+#   source = ReplaySource(file, block_duration=0.1, speed=10)
+#   epocher = StreamingEpocher(source.info, event_id, tmin=-1, tmax=5)
+#   online_epochs = epocher.to_epochs(list(epocher.run(source)))
+#   if online_epochs is not None:
+#       online_epochs.save('./music_stress_online-epo.fif', overwrite=True)
+#   print(epocher.latency_summary())
@@ -0,0 +1,199 @@
+"""
+Created on Mon Oct 19 14:25:51 2026
+
+@author: Malte Güth
+"""
+
+# Epoching the EDA and respiration channels while they are recorded, to monitor the responses during a session in the
+# scanner. import_epochs.py reads a finished recording, finds all events and cuts the epochs at once. Here, the data
+# arrive in small blocks of samples from a source instead. Each block is searched for trigger onsets as soon as it
+# arrives, and the last few seconds of data are kept in a ring buffer that is just long enough for one epoch plus one
+# block. An epoch is handed out in the same block that completes it, i.e. at most one block (plus the time it takes
+# to process it) after its last sample was recorded.
+#
+#   source = ReplaySource('/Volumes/INTENSO/music_stress/HOAF_EDA_Resp0002.vhdr', block_duration=0.1, speed=10)
+#   epocher = StreamingEpocher(source.info, event_id={'response_or_something': 1}, tmin=-1, tmax=5)
+#   for event, data in epocher.run(source):
+#       print(event, data.mean(axis=1))
+#   print(epocher.latency_summary())
+#
+# A source is any object with an info (the MNE measurement info of the stream) and a blocks() method that yields the
+# first sample, the data (channels x samples) and the time (time.perf_counter()) at which each block was complete.
+# ReplaySource plays a recorded file back at its original speed (speed=1), faster (e.g. speed=10) or as fast as
+# possible (speed=None), which is useful to test the online analysis before the session. A source reading from the
+# amplifier (e.g. BrainVision's RDA or a lab streaming layer inlet) only needs the same two parts.
+
+import collections
+import time
+
+import numpy as np
+
+import mne
+
+
+class ReplaySource(object):
+    """Play back a recording (an MNE Raw object or the path to a .vhdr file) in blocks of block_duration seconds.
+
+    speed=1 plays in real time, higher values faster, None without waiting.
+    """
+
+    def __init__(self, raw, block_duration=0.1, speed=1.):
+        if isinstance(raw, str):
+            raw = mne.io.read_raw_brainvision(raw, preload=False)
+        self.raw = raw
+        self.info = raw.info
+        self.block_size = max(int(round(block_duration * raw.info['sfreq'])), 1)
+        self.speed = speed
+
+    def blocks(self):
+        sfreq = self.info['sfreq']
+        start_time = time.perf_counter()
+        for start in range(0, self.raw.n_times, self.block_size):
+            stop = min(start + self.block_size, self.raw.n_times)
+            if self.speed is not None:
+                # Wait until the last sample of the block would have been recorded.
+                delay = start_time + stop / sfreq / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            data = self.raw.get_data(start=start, stop=stop)
+            yield start, data, time.perf_counter() if self.speed is None else start_time + stop / sfreq / self.speed
+
+
+class TriggerDetector(object):
+    """Find trigger onsets in a stim channel block by block, like mne.find_events with its default settings.
+
+    An onset is a sample at which the channel rises to a non-zero value. The last value of each block is kept, so
+    triggers that start right at the beginning of a block are found, too.
+    """
+
+    def __init__(self):
+        self.last = 0
+
+    def detect(self, first_sample, stim):
+        stim = np.asarray(stim).astype(int)
+        previous = np.concatenate([[self.last], stim[:-1]])
+        onsets = np.where((stim > previous) & (stim > 0))[0]
+        if len(stim):
+            self.last = stim[-1]
+        return np.column_stack([first_sample + onsets, previous[onsets], stim[onsets]]).astype(int)
+
+
+class StreamingEpocher(object):
+    """Cut epochs from tmin to tmax seconds around the events of event_id out of a stream of blocks.
+
+    picks are the channels to epoch (by default the misc channels, i.e. GSR_MR_100 and Resp), stim_channel the
+    channel with the triggers.
+    """
+
+    def __init__(self, info, event_id, tmin=-1., tmax=5., picks=None, stim_channel='Stim', max_block_size=None):
+        self.info = info
+        self.event_id = dict(event_id)
+        sfreq = info['sfreq']
+        self.start_offset = int(round(tmin * sfreq))
+        self.stop_offset = int(round(tmax * sfreq)) + 1
+        self.picks = mne.pick_types(info, meg=False, misc=True) if picks is None else picks
+        self.stim_pick = info['ch_names'].index(stim_channel)
+        self.detector = TriggerDetector()
+
+        # The buffer holds one epoch plus one block, so every epoch is still complete in it when its last block
+        # arrives. It grows if a source delivers larger blocks than max_block_size.
+        self.n_times = self.stop_offset - self.start_offset
+        self.buffer = np.zeros((len(self.picks), self.n_times + (max_block_size or int(sfreq))))
+        self.n_received = 0
+        self.pending = collections.deque()
+
+        self.block_latencies = []
+        self.epoch_latencies = []
+        self.n_epochs = 0
+
+    def _write(self, block):
+        # Write the block behind the samples received so far, wrapping around at the end of the buffer.
+        n_samples = block.shape[1]
+        if n_samples + self.n_times > self.buffer.shape[1]:
+            self._resize(n_samples + self.n_times)
+        positions = (self.n_received + np.arange(n_samples)) % self.buffer.shape[1]
+        self.buffer[:, positions] = block
+
+    def _resize(self, size):
+        # Keep the most recent samples in their order.
+        kept = min(self.n_received, self.buffer.shape[1])
+        recent = self._read(self.n_received - kept, self.n_received)
+        self.buffer = np.zeros((len(self.picks), size))
+        self.buffer[:, (self.n_received - kept + np.arange(kept)) % size] = recent
+
+    def _read(self, start, stop):
+        return self.buffer[:, np.arange(start, stop) % self.buffer.shape[1]]
+
+    def process(self, first_sample, data, acquired=None):
+        """Add a block (all channels x samples, starting at first_sample) and return the epochs it completes.
+
+        Returns a list of (event, data) with the MNE event (sample, previous value, code) and the epoch's data
+        (channels x samples). acquired is the time.perf_counter() time at which the block was complete.
+        """
+        data = np.asarray(data)
+        if first_sample != self.n_received:
+            raise ValueError('Expected a block starting at sample %d, got %d. Samples were lost or repeated.'
+                             % (self.n_received, first_sample))
+        if acquired is None:
+            acquired = time.perf_counter()
+
+        self._write(data[self.picks])
+        self.n_received += data.shape[1]
+
+        for event in self.detector.detect(first_sample, data[self.stim_pick]):
+            # Epochs starting before the first sample of the stream can't be completed.
+            if event[2] in self.event_id.values() and event[0] + self.start_offset >= 0:
+                self.pending.append(event)
+
+        epochs = []
+        while self.pending and self.pending[0][0] + self.stop_offset <= self.n_received:
+            event = self.pending.popleft()
+            epochs.append((event, self._read(event[0] + self.start_offset, event[0] + self.stop_offset)))
+
+        done = time.perf_counter()
+        self.block_latencies.append(done - acquired)
+        # The last sample of each epoch arrived with this block, but was recorded before the samples after it in the
+        # block, so its latency is that of the block plus the duration of those samples.
+        self.epoch_latencies.extend(done - acquired + (self.n_received - event[0] - self.stop_offset) /
+                                    self.info['sfreq'] for event, epoch_data in epochs)
+        self.n_epochs += len(epochs)
+        return epochs
+
+    def run(self, source):
+        """Process all blocks of source and yield each epoch as (event, data) as soon as it is complete."""
+        for first_sample, data, acquired in source.blocks():
+            for epoch in self.process(first_sample, data, acquired):
+                yield epoch
+
+    def latency_summary(self):
+        """Median, 95th percentile and maximum time (in ms) from the end of a block until it was processed.
+
+        The same numbers for the epochs ('epoch_median_ms', ...) give the time from the last sample of each epoch
+        until the epoch was handed out.
+        """
+        latencies = np.array(self.block_latencies) * 1e3
+        if not len(latencies):
+            return dict(n_blocks=0, n_epochs=0)
+        summary = collections.OrderedDict(n_blocks=len(latencies), n_epochs=self.n_epochs,
+                                          median_ms=float(np.median(latencies)),
+                                          p95_ms=float(np.percentile(latencies, 95)),
+                                          max_ms=float(latencies.max()))
+        epoch_latencies = np.array(self.epoch_latencies) * 1e3
+        if len(epoch_latencies):
+            summary.update(epoch_median_ms=float(np.median(epoch_latencies)),
+                           epoch_p95_ms=float(np.percentile(epoch_latencies, 95)),
+                           epoch_max_ms=float(epoch_latencies.max()))
+        return summary
+
+    def to_epochs(self, epochs):
+        """Turn a list of (event, data) as returned by process into an MNE EpochsArray, e.g. to save it.
+
+        Returns None if the list is empty (e.g. no trigger arrived during the session), since MNE has no empty epochs.
+        """
+        if not len(epochs):
+            return None
+        events = np.array([event for event, data in epochs], dtype=int).reshape(-1, 3)
+        info = mne.pick_info(self.info, self.picks)
+        event_id = dict((name, code) for name, code in self.event_id.items() if code in events[:, 2])
+        return mne.EpochsArray(np.array([data for event, data in epochs]), info, events=events,
+                               tmin=self.start_offset / self.info['sfreq'], event_id=event_id, verbose=False)
@@ -0,0 +1,113 @@
+"""
+Created on Mon Oct 19 09:36:22 2026
+
+@author: Malte Güth
+"""
+
+# Finding the ICA components that reflect eye movements (or heart beats) by correlating them with the EOG (or ECG)
+# channels. ica.find_bads_eog computes all ICA sources from the raw data again for every EOG channel, and the
+# correlations are computed with one pearsonr call per component. Here, the raw data of the ICA channels and of all
+# reference channels are read once, the sources are computed once and filtered together with the reference channels,
+# and the correlations of all components with all reference channels come from a single matrix product of the
+# standardized signals:
+#
+#   scores = score_components(ica, raw, ['VEOG', 'LHZ'])
+#   scores['VEOG']          # correlation of each component with the vertical EOG (blinks)
+#   scores.bads['LHZ']      # components marked for the horizontal EOG (saccades), strongest first
+#   scores.exclude          # all marked components, the strongest correlation first
+#
+# Components are marked like find_bads_eog does it: a component is marked if the z-score of its correlation (among
+# the correlations of all components with that channel) is above threshold, and the z-scores are computed again
+# without the marked components, up to max_iter times.
+
+import numpy as np
+
+import mne
+
+
+def ica_sources(ica, data):
+    """ICA sources of data (the channels of ica.ch_names x n_times), as ica.get_sources would return them."""
+    data = data / ica.pre_whitener_
+    if ica.pca_mean_ is not None:
+        data = data - ica.pca_mean_[:, np.newaxis]
+    return np.dot(ica.unmixing_matrix_, np.dot(ica.pca_components_[:ica.n_components_], data))
+
+
+def correlate(sources, references):
+    """Pearson correlations of every source (rows of sources) with every reference signal (rows of references).
+
+    Returns an array of n_references x n_sources.
+    """
+    def standardize(signals):
+        signals = signals - signals.mean(axis=-1, keepdims=True)
+        return signals / np.linalg.norm(signals, axis=-1, keepdims=True)
+    return np.dot(standardize(references), standardize(sources).T)
+
+
+def find_outliers(scores, threshold=3., max_iter=2):
+    """Outliers in each row of scores, found with iterated z-scoring of their absolute value.
+
+    Returns a boolean array of the same shape as scores.
+    """
+    scores = np.atleast_2d(scores)
+    bad = np.zeros(scores.shape, dtype=bool)
+    for _ in range(max_iter):
+        good = ~bad
+        n_good = good.sum(axis=-1, keepdims=True)
+        mean = (scores * good).sum(axis=-1, keepdims=True) / n_good
+        std = np.sqrt((((scores - mean) * good) ** 2).sum(axis=-1, keepdims=True) / n_good)
+        new_bad = good & (np.abs(scores - mean) > threshold * std)
+        if not new_bad.any():
+            break
+        bad |= new_bad
+    return bad
+
+
+class ComponentScores(dict):
+    """Correlations of the ICA components with each reference channel (dict of channel name -> array).
+
+    bads holds the marked components of each channel and exclude all marked components, both in the order of their
+    strongest correlation, like the indices returned by find_bads_eog.
+    """
+
+    def __init__(self, ch_names, scores, bad):
+        dict.__init__(self, zip(ch_names, scores))
+        # Like find_bads_eog, the marked components of each channel are sorted by their correlation, strongest first.
+        self.bads = dict((name, [int(idx) for idx in np.argsort(-np.abs(channel_scores), kind='mergesort')
+                                 if channel_bad[idx]])
+                         for name, channel_scores, channel_bad in zip(ch_names, scores, bad))
+        strongest = np.where(bad, np.abs(scores), 0).max(axis=0)
+        self.exclude = [int(idx) for idx in np.argsort(-strongest, kind='mergesort') if bad[:, idx].any()]
+
+
+def score_components(ica, raw, ch_names=None, threshold=3., max_iter=2, l_freq=1, h_freq=10, start=None,
+                     stop=None):
+    """Correlate all ICA components with all reference channels of raw in one go.
+
+    ch_names are the reference channels and default to all EOG channels. Both the sources and the references are
+    band-pass filtered between l_freq and h_freq (in Hz) first, like find_bads_eog does (l_freq=5, h_freq=35 is
+    common for ECG). start and stop are in seconds. Returns a ComponentScores.
+    """
+    if ch_names is None:
+        ch_names = [raw.ch_names[pick] for pick in mne.pick_types(raw.info, meg=False, eog=True)]
+    if isinstance(ch_names, str):
+        ch_names = [ch_names]
+
+    sfreq = raw.info['sfreq']
+    start = None if start is None else int(round(start * sfreq))
+    stop = None if stop is None else int(round(stop * sfreq))
+
+    # Read the ICA channels and the reference channels together, once.
+    picks = [raw.ch_names.index(name) for name in ica.ch_names]
+    ref_picks = [raw.ch_names.index(name) for name in ch_names]
+    data = raw.get_data(picks=picks + ref_picks, start=start or 0, stop=stop)
+    signals = np.concatenate([ica_sources(ica, data[:len(picks)]), data[len(picks):]])
+
+    if l_freq is not None and h_freq is not None:
+        # The same filter find_bads_eog uses, applied to the sources and references in one call.
+        signals = mne.filter.filter_data(signals, sfreq, l_freq, h_freq, filter_length='10s',
+                                         l_trans_bandwidth=0.5, h_trans_bandwidth=0.5, phase='zero-double',
+                                         fir_window='hann', fir_design='firwin2', verbose=False)
+
+    scores = correlate(signals[:ica.n_components_], signals[ica.n_components_:])
+    return ComponentScores(ch_names, scores, find_outliers(scores, threshold, max_iter))
@@ -111,22 +111,49 @@ for x in range(1, 14):
 import glob
 import os
 
+# The profiler notes how long each step takes for each subject, how much memory it needs and how many bytes it reads
+# and writes (see instrumentation.py), so you can see where the time of the loop goes.
+from instrumentation import Profiler, summarize
+
 data_path = 'your path to all your raw files'     
+profiler = Profiler(os.path.join(data_path, 'profile.jsonl'))
 for file in glob.glob(os.path.join(data_path, '*.bdf')):
     
     filepath, filename = os.path.split(file)
     filename, ext = os.path.splitext(filename)
       
-    raw = mne.io.read_raw_edf(file, montage=montage, preload=True, stim_channel=-1,
-                              eog=[u'EXG1', u'EXG2'] exclude=[u'EXG3', u'EXG4', u'EXG5', u'EXG6', u'EXG7', u'EXG8']) 
+    with profiler.stage('read', filename):
+        raw = mne.io.read_raw_edf(file, montage=montage, preload=True, stim_channel=-1, eog=[u'EXG1', u'EXG2'],
+                                  exclude=[u'EXG3', u'EXG4', u'EXG5', u'EXG6', u'EXG7', u'EXG8'])
     picks = mne.pick_types(raw.info, meg=False, eeg=True, eog=True, stim=True)
     
-    raw.filter(0.5, 30., n_jobs=1, fir_design='firwin') 
-    raw.set_eeg_reference(ref_channels='average') 
+    with profiler.stage('filter', filename):
+        raw.filter(0.5, 30., n_jobs=1, fir_design='firwin') 
+    with profiler.stage('reference', filename):
+        raw.set_eeg_reference(ref_channels='average') 
     
-    ica.fit(raw, picks=picks, decim=decim)
-    ica.save(filename + '-ica.fif')
+    with profiler.stage('ica', filename):
+        ica.fit(raw, picks=picks, decim=decim)
+    with profiler.stage('save', filename):
+        ica.save(filename + '-ica.fif')
+
+    # Fitting ICA takes most of the time here. fit_ica from ica_fitting.py chooses the decimation for the number of
+    # components and can start from the ICA of an earlier session of the same subject. It returns statistics of the
+    # fit (time, samples, iterations) instead of printing them:
+    #   ica, stats = fit_ica(raw, n_components=n_components, method=method, picks=picks, decim='auto',
+    #                        previous='./Sub1_session1-ica.fif')
+    #   print(format_stats(stats))
+
+# Time, CPU time, peak memory and bytes read and written of each step, summed over all subjects.
+for stage, total in summarize(profiler.read_records()).items():
+    print('%-10s %8.1f s %8.1f s CPU %8.0f MB peak %8.0f MB read %8.0f MB written' % (
+        stage, total['wall_seconds'], total['cpu_seconds'], total['peak_rss'] / 1e6, total['bytes_read'] / 1e6,
+        total['bytes_written'] / 1e6))
     
+# Both loops handle one subject after the other. If you have a machine with many cores, have a look at
+# parallel_data_cleaning.py, which runs the same steps for several subjects at the same time and skips subjects
+# whose ICA file is already up to date.
+
 # Concerning ICA component rejection, I will upload further scripts showing an advanced method of identifying 
 # artefact components. For a start, I recommend that you do this manually by checking the component properties of
 # each subject yourself. This is also very useful in learning more about how EEG signal is composed and what
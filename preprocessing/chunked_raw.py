@@ -0,0 +1,210 @@
+"""
+Created on Sun Oct 18 11:26:40 2026
+
+@author: Malte Güth
+"""
+
+# Processing long recordings without loading them into memory. All scripts in this repository read raw data with
+# preload=True, which is fine for a 1024 Hz lab recording, but our simultaneous EEG-fMRI sessions at 5000 Hz take up
+# several GB each. The functions below read a raw file that was opened with preload=False in blocks of a few seconds,
+# filter, re-reference and resample each block and write the result straight into a memory-mapped .npy file on disk.
+# Neighbouring blocks overlap by half the filter length, so the result is the same as filtering the whole recording
+# at once with raw.filter, while memory use only depends on the block length. The beginning and end of the recording
+# are padded the way raw.filter pads them. The resampling is done with scipy's polyphase filter rather than with the
+# FFT of raw.resample, though, so after down-sampling the result is that of raw.resample(..., method='polyphase') (in
+# recent MNE versions) everywhere but in the first and last few hundred milliseconds, which are padded differently.
+#
+#   raw = mne.io.read_raw_brainvision('./Sub1.vhdr', preload=False)
+#   process_chunked(raw, './Sub1-filt.npy', l_freq=0.1, h_freq=30., ref_channels=['TP9', 'TP10'], sfreq_new=250)
+#   raw_filt = load_chunked('./Sub1-filt.npy')
+#
+# All three steps are done in a single sweep over each block, while it is in memory. The band-pass filter is applied
+# with an FFT (as raw.filter does for long filters), then the block is down-sampled with scipy's polyphase filter
+# (resample_poly). Since re-referencing just mixes channels and the filters work on each channel separately, the order
+# doesn't matter, and the reference is subtracted after down-sampling, when there are far fewer samples left.
+#
+# Only for short band-pass filters (no or a high high-pass cut-off) are the band-pass and the anti-aliasing filter
+# combined into one FIR filter, which upfirdn applies directly, computing only the samples that are kept. The direct
+# filter costs its length per kept sample, so with a 0.1 Hz high-pass (a filter of several seconds, i.e. tens of
+# thousands of coefficients at 5000 Hz) the FFT is faster by orders of magnitude. MAX_FUSED_TAPS sets the limit.
+#
+# Stimulus channels are not filtered or re-referenced. When resampling, each new sample of a stimulus channel takes
+# the largest value of the old samples it replaces, so that short triggers are not lost.
+
+import contextlib
+import fractions
+import math
+import os
+
+import numpy as np
+from scipy.signal import fftconvolve, firwin, resample_poly, upfirdn
+
+import mne
+
+# The combined filter is only applied directly if it has at most this many coefficients per sample of the original
+# data. Beyond that, filtering with an FFT and resampling afterwards is faster.
+MAX_FUSED_TAPS = 32
+
+
+def fir_kernel(sfreq, l_freq, h_freq):
+    # The same zero-phase FIR filter raw.filter would use with fir_design='firwin'.
+    return mne.filter.create_filter(None, sfreq, l_freq, h_freq, fir_design='firwin', verbose=False)
+
+
+def resampling_factors(sfreq, sfreq_new):
+    # Up- and down-sampling factors for polyphase resampling, e.g. 5000 Hz -> 250 Hz gives (1, 20).
+    ratio = fractions.Fraction(sfreq_new / sfreq).limit_denominator(1000)
+    return ratio.numerator, ratio.denominator
+
+
+def fused_kernel(sfreq, l_freq, h_freq, up=1, down=1):
+    """One FIR filter for band-pass filtering and resampling by up / down, at the up-sampled rate.
+
+    The band-pass is the filter raw.filter would use, the anti-aliasing low-pass the one of scipy's resample_poly.
+    Returns the kernel and the index of its center (the delay it introduces).
+    """
+    if l_freq is not None or h_freq is not None:
+        kernel = fir_kernel(sfreq, l_freq, h_freq)
+    else:
+        kernel = np.ones(1)
+
+    if (up, down) != (1, 1):
+        # Filtering before up-sampling is the same as filtering after up-sampling with a kernel that has up - 1
+        # zeros between its coefficients.
+        stuffed = np.zeros((len(kernel) - 1) * up + 1)
+        stuffed[::up] = kernel
+        max_rate = max(up, down)
+        anti_alias = firwin(2 * 10 * max_rate + 1, 1. / max_rate, window=('kaiser', 5.0)) * up
+        kernel = np.convolve(stuffed, anti_alias)
+    return kernel, (len(kernel) - 1) // 2
+
+
+def reference_indices(info, picks, ref_channels):
+    """Positions (within picks) of the EEG channels to re-reference and of the reference channels."""
+    names = [info['ch_names'][pick] for pick in picks]
+    eeg_picks = set(mne.pick_types(info, meg=False, eeg=True, exclude=[]))
+    eeg = [ii for ii, pick in enumerate(picks) if pick in eeg_picks]
+    if ref_channels == 'average':
+        ref = eeg
+    else:
+        ref = [names.index(name) for name in ref_channels]
+    return eeg, ref
+
+
+def read_padded(raw, picks, start, stop):
+    # Read samples start to stop. Where the range reaches beyond the recording, the data are padded like raw.filter
+    # pads them ('reflect_limited'): mirrored at the first (last) sample and flipped around its value, and zeros
+    # beyond the length of the data that were read.
+    n_times = raw.n_times
+    data = raw.get_data(picks=picks, start=max(start, 0), stop=min(stop, n_times))
+    before, after = max(-start, 0), max(stop - n_times, 0)
+    if before or after:
+        n_read = data.shape[-1]
+        left = 2 * data[:, :1] - data[:, before:0:-1] if start < 0 else data[:, :0]
+        right = 2 * data[:, -1:] - data[:, -2:-after - 2:-1] if stop > n_times else data[:, :0]
+        data = np.concatenate([np.zeros((len(data), max(before - n_read + 1, 0))), left, data, right,
+                               np.zeros((len(data), max(after - n_read + 1, 0)))], axis=-1)
+    return data
+
+
+def resample_stim(stim, up, down, n_out):
+    # New sample k covers the old samples from k * down / up up to (k + 1) * down / up; keep the largest value.
+    edges = (np.arange(n_out) * down) // up
+    return np.maximum.reduceat(stim, edges, axis=-1) if stim.size else stim[:, :n_out]
+
+
+def process_chunked(raw, out_file, l_freq=None, h_freq=None, ref_channels=None, sfreq_new=None,
+                    chunk_duration=10., info_file=None):
+    """Filter, re-reference and resample raw block by block and write the result to out_file (.npy).
+
+    raw can (and should) be opened with preload=False. ref_channels is 'average', a list of channel names or None
+    for no re-referencing. The measurement info of the result is saved to info_file (by default next to out_file
+    with the ending '-info.fif'). Returns the memory-mapped result and its info.
+    """
+    sfreq = raw.info['sfreq']
+    data_picks = mne.pick_types(raw.info, meg=False, eeg=True, eog=True, ecg=True, emg=True, misc=True,
+                                exclude=[])
+    stim_picks = mne.pick_types(raw.info, meg=False, stim=True, exclude=[])
+    picks = np.concatenate([data_picks, stim_picks]).astype(int)
+
+    up, down = resampling_factors(sfreq, sfreq_new) if sfreq_new is not None else (1, 1)
+    kernel, center = fused_kernel(sfreq, l_freq, h_freq, up, down)
+    fused = len(kernel) <= MAX_FUSED_TAPS * down
+
+    if fused:
+        # Each block is read with some context on both sides, so that the filter sees the neighbouring samples. The
+        # context is a multiple of down, and the kernel gets leading zeros until its delay plus the context falls onto
+        # a sample that is kept after down-sampling.
+        pad = int(math.ceil((center + down) / float(up * down))) * down
+        shift = (-(pad * up + center)) % down
+        kernel = np.concatenate([np.zeros(shift), kernel])
+        first = (pad * up + center + shift) // down
+    else:
+        kernel = fir_kernel(sfreq, l_freq, h_freq) if (l_freq is not None or h_freq is not None) else np.ones(1)
+        filter_pad = (len(kernel) - 1) // 2
+        # resample_poly uses a filter that reaches 10 * max(up, down) samples at the up-sampled rate to each side.
+        resample_pad = 0
+        if (up, down) != (1, 1):
+            resample_pad = int(math.ceil(10. * max(up, down) / up / down)) * down + down
+        pad = filter_pad + resample_pad
+
+    if ref_channels is not None:
+        eeg, ref = reference_indices(raw.info, data_picks, ref_channels)
+
+    # Blocks have to start at multiples of down, so that the new samples of all blocks line up.
+    chunk = max(int(chunk_duration * sfreq) // down, 1) * down
+    n_times = raw.n_times
+    n_out = int(math.ceil(n_times * up / float(down)))
+
+    out = np.lib.format.open_memmap(out_file, mode='w+', dtype=np.float64, shape=(len(picks), n_out))
+    n_data = len(data_picks)
+    for start in range(0, n_times, chunk):
+        stop = min(start + chunk, n_times)
+        block = read_padded(raw, picks, start - pad, stop + pad)
+
+        out_start = start * up // down
+        out_stop = min(int(math.ceil(stop * up / float(down))), n_out)
+
+        if fused:
+            # Filter and resample in one go.
+            data = upfirdn(kernel, block[:n_data], up, down, axis=-1)[:, first:first + out_stop - out_start]
+        else:
+            # Filtering with 'valid' convolution drops the filter padding at both sides of the block.
+            data = fftconvolve(block[:n_data], kernel[np.newaxis, :], mode='valid', axes=-1)
+            if (up, down) != (1, 1):
+                skip = resample_pad * up // down
+                data = resample_poly(data, up, down, axis=-1)[:, skip:skip + out_stop - out_start]
+        # Re-reference the (much shorter) result.
+        if ref_channels is not None:
+            data[eeg] -= data[ref].mean(axis=0)
+        stim = resample_stim(block[n_data:, pad:pad + stop - start], up, down, out_stop - out_start)
+
+        out[:n_data, out_start:out_stop] = data
+        out[n_data:, out_start:out_stop] = stim
+    out.flush()
+
+    info = mne.create_info([raw.ch_names[pick] for pick in picks], sfreq * up / down,
+                           [mne.channel_type(raw.info, pick) for pick in picks])
+    # Note the filter in the info, as raw.filter and raw.resample do, so that later filters and plots know about it.
+    highpass = raw.info['highpass'] if l_freq is None else max(l_freq, raw.info['highpass'])
+    lowpass = raw.info['lowpass'] if h_freq is None else min(h_freq, raw.info['lowpass'])
+    with info._unlock() if hasattr(info, '_unlock') else contextlib.suppress():
+        info['highpass'] = float(highpass)
+        info['lowpass'] = float(min(lowpass, info['sfreq'] / 2.))
+    montage = raw.get_montage()
+    if montage is not None:
+        info.set_montage(montage, on_missing='ignore')
+    if info_file is None:
+        info_file = os.path.splitext(out_file)[0] + '-info.fif'
+    if os.path.isfile(info_file):
+        os.remove(info_file)
+    mne.io.write_info(info_file, info)
+    return out, info
+
+
+def load_chunked(out_file, info_file=None):
+    """Open the result of process_chunked as an MNE Raw object without reading it into memory."""
+    if info_file is None:
+        info_file = os.path.splitext(out_file)[0] + '-info.fif'
+    data = np.load(out_file, mmap_mode='r')
+    return mne.io.RawArray(data, mne.io.read_info(info_file), verbose=False)
@@ -0,0 +1,107 @@
+"""
+Created on Sun Oct 18 20:31:18 2026
+
+@author: Malte Güth
+"""
+
+# Exporting epochs for analyses in R or pandas as a Parquet dataset instead of one big .csv file. Appending every
+# subject's data frame to one growing data frame copies all earlier subjects again each time, and the .csv with the
+# epochs of a whole study takes up tens of GB and minutes to read back in. Here, each subject is written to disk as
+# soon as its epochs are read, so only one subject is in memory at a time:
+#
+#   for file in glob.glob('./epochs/*-epo.fif'):
+#       epochs = mne.read_epochs(file)
+#       export_epochs(epochs['music_onset'], './eeg_epochs/', subject=os.path.basename(file)[:-8],
+#                     condition='music_onset')
+#
+# The dataset is a folder with one subfolder per subject and condition (e.g. eeg_epochs/subject=sub-01/
+# condition=music_onset/part-0.parquet) and a table in long format: one row per epoch, channel and sample point,
+# with the columns epoch, channel, time (in ms) and value (in µV for EEG), stored as float32. Channel names are
+# stored once per file (dictionary encoding) instead of once per row. The rows are sorted by channel and each channel
+# is written as its own block, so readers that only ask for a few channels, subjects or a time window skip the rest
+# of the files, e.g. in R with arrow::open_dataset('./eeg_epochs/') or in Python with read_epochs_dataset below.
+#
+# Parquet files are written with pyarrow, which has to be installed for this (pip install pyarrow).
+
+import numpy as np
+
+import mne
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = ds = None
+
+
+def _check_pyarrow():
+    if pa is None:
+        raise ImportError('Writing and reading Parquet datasets requires pyarrow (pip install pyarrow).')
+
+
+def epochs_to_table(epochs, scaling_time=1e3, scalings=None):
+    """The data of epochs as a pyarrow table in long format (epoch, channel, time, value), sorted by channel.
+
+    Like epochs.to_data_frame, the data are scaled to µV for EEG (see mne.defaults.DEFAULTS['scalings']) and the
+    times to ms with scaling_time. scalings can override the scaling of single channel types, e.g. dict(eeg=1).
+    """
+    _check_pyarrow()
+    channel_scalings = dict(mne.defaults.DEFAULTS['scalings'])
+    channel_scalings.update(scalings or {})
+    factors = np.array([channel_scalings.get(mne.channel_type(epochs.info, pick), 1.)
+                        for pick in range(len(epochs.ch_names))])
+
+    # n_channels x n_epochs x n_times, so that the rows of each channel follow each other.
+    data = (epochs.get_data() * factors[:, np.newaxis]).transpose(1, 0, 2).astype(np.float32)
+    n_channels, n_epochs, n_times = data.shape
+    n_rows = n_epochs * n_times
+
+    channel = pa.DictionaryArray.from_arrays(np.repeat(np.arange(n_channels, dtype=np.int32), n_rows),
+                                             pa.array(epochs.ch_names))
+    epoch = np.tile(np.repeat(epochs.selection.astype(np.int32), n_times), n_channels)
+    time = np.tile((epochs.times * scaling_time).astype(np.float32), n_epochs * n_channels)
+    return pa.table(dict(epoch=epoch, channel=channel, time=time, value=data.ravel()))
+
+
+def export_epochs(epochs, root, subject, condition, scaling_time=1e3, scalings=None):
+    """Write the epochs of one subject and condition to the Parquet dataset in the folder root.
+
+    Data written for the same subject and condition before are replaced, the other subjects are kept.
+    """
+    _check_pyarrow()
+    table = epochs_to_table(epochs, scaling_time, scalings)
+    table = table.append_column('subject', pa.array([subject] * table.num_rows).dictionary_encode())
+    table = table.append_column('condition', pa.array([condition] * table.num_rows).dictionary_encode())
+
+    # Each channel is its own row group, whose statistics let readers skip channels they did not ask for.
+    rows_per_channel = max(table.num_rows // max(len(epochs.ch_names), 1), 1)
+    partitioning = ds.partitioning(pa.schema([('subject', pa.string()), ('condition', pa.string())]),
+                                   flavor='hive')
+    ds.write_dataset(table, root, format='parquet', partitioning=partitioning,
+                     basename_template='part-{i}.parquet', existing_data_behavior='delete_matching',
+                     max_rows_per_group=rows_per_channel, min_rows_per_group=rows_per_channel)
+
+
+def read_epochs_dataset(root, subjects=None, conditions=None, channels=None, tmin=None, tmax=None):
+    """Read (part of) a dataset written by export_epochs into a pandas data frame.
+
+    Only the given subjects, conditions and channels and the times from tmin to tmax (in ms) are read from disk.
+    """
+    _check_pyarrow()
+    dataset = ds.dataset(root, format='parquet', partitioning='hive')
+    filters = []
+    if subjects is not None:
+        filters.append(ds.field('subject').isin(list(subjects)))
+    if conditions is not None:
+        filters.append(ds.field('condition').isin(list(conditions)))
+    if channels is not None:
+        filters.append(ds.field('channel').isin(list(channels)))
+    if tmin is not None:
+        filters.append(ds.field('time') >= tmin)
+    if tmax is not None:
+        filters.append(ds.field('time') <= tmax)
+
+    row_filter = None
+    for expression in filters:
+        row_filter = expression if row_filter is None else row_filter & expression
+    return dataset.to_table(filter=row_filter).to_pandas()
@@ -72,6 +72,14 @@ epochs['B']
 # represented by 71.
 mne.merge_events(events, [71, 72, 73, 74, 75], 71, replace_events=True)
 
+# 3) If you need to recode many codes at once (or want a different new code for each of them), use recode_events
+# from event_recoding.py. It takes a dict of old and new codes and recodes all events in one go. With
+# unmapped='keep', all codes that are not in the dict stay as they are; 'raise' would complain about them and
+# 'drop' would remove them from the event array.
+from event_recoding import recode_events
+
+events = recode_events(events, {72: 71, 73: 71, 74: 71, 75: 71}, unmapped='keep')
+
 # As described above, there are also probes in the paradigm. These elicit
 # a large P3, which is sensitive to expectancy violations, because subjects 
 # needed to adapt their behavior if an ambiguous cue was followed by an
@@ -81,85 +89,32 @@ mne.merge_events(events, [71, 72, 73, 74, 75], 71, replace_events=True)
 # difficulty is that 'Y' is represented the same way 'B' is. There is multiple
 # codes for 'Y' (77-81).
 
-# The most starightforward solution, in my opinion, is to re-write
-# the event array with a for loop and assign new codes. This can be 
-# written shorter, but for clarity's sake I'll be more detailed.
+# The most straightforward solution, in my opinion, is to describe each sequence
+# as a pattern of a first event (the cue) followed by a second event (the probe)
+# and to let the probe of every sequence we find be re-written with a new code.
 # The new assignment of event_ids shall be: {AX: 1, BX: 2, AY: 3, BY: 4}.
-
-# Create a 1D array with all codes.
-new_events = events[:,2]
-
-# Create a intermediary variable for noting the cue code and set it to 0.
-# temp_cue will be used to store information about the first stimulus
-# in our sequence, which is 'A' (1) or 'B' (2).
-temp_cue = 0
-
-# Build a for loop with multiple if conditions to find the sequences. The loop should
-# iterate through all elements of the event column. Then, with each iteration of the loop
-# we will look through all event codes, search for a cue code, set the temp_cue to a
-# specific value if a cue is found, continue by searching for the next probe, re-code the
-# probe according to the value of temp_cue, set the temp_cue back to zero, and get
-# to the next element in the event array.
-for i in range(new_events.size):
-    
-    # The first if statement codes the cue. If an 'A' is found and the temp_cue is 0.
-    # set the temp_cue to 1 (i.e., we found an A).
-    if (new_events[i] == 70 and temp_cue == 0):
-        temp_cue = 1
-    # Otherwise, if any of the codes for 'B' is found and the temp_cue is 0, set the
-    # temp_cue to 2.
-    elif (new_events[i] == 71 and temp_cue == 0):
-        temp_cue = 2
-    elif (new_events[i] == 72 and temp_cue == 0):
-        temp_cue = 2
-    elif (new_events[i] == 73 and temp_cue == 0):
-        temp_cue = 2
-    elif (new_events[i] == 74 and temp_cue == 0):
-        temp_cue = 2
-    elif (new_events[i] == 75 and temp_cue == 0):
-        temp_cue = 2
-    
-    # After we coded the cue-section of the sequence, we move on to the probe.
-    if temp_cue == 1:
-        # If the temp_cue has already been set through the first if condition, is set 1,
-        # and a code for 'X' is found, change the value in row i, which corresponds to the
-        # current probe value to a new value that specifically codes 'AX'.
-        if new_events[i] == 76:
-            new_events[i] = 1
-            # Don't forget to set the temp_cue back to 0.
-            temp_cue = 0
-        # Now do the same for 'AY' with one statement for each code of 'Y'.
-        elif new_events[i] == 77:
-            new_events[i] = 3
-            temp_cue = 0
-        elif new_events[i] == 78:
-            new_events[i] = 3
-            temp_cue = 0
-        elif new_events[i] == 79:
-            new_events[i] = 3
-            temp_cue = 0
-        elif new_events[i] == 80:
-            new_events[i] = 3
-            temp_cue = 0
-        elif new_events[i] == 81:
-            new_events[i] = 3
-            temp_cue = 0
-    elif temp_cue == 2:
-        if new_events[i] == 76:
-            new_events[i] = 2
-            temp_cue = 0
-        elif new_events[i] == 77:
-            new_events[i] = 4
-            temp_cue = 0
-        elif new_events[i] == 78:
-            new_events[i] = 4
-            temp_cue = 0
-        elif new_events[i] == 79:
-            new_events[i] = 4
-            temp_cue = 0
-        elif new_events[i] == 80:
-            new_events[i] = 4
-            temp_cue = 0
-        elif new_events[i] == 81:
-            new_events[i] = 4
-            temp_cue = 0
+from sequence_matching import sequence, compile_sequences
+
+codes_B = [71, 72, 73, 74, 75]
+codes_Y = [77, 78, 79, 80, 81]
+
+# Each pattern takes the code(s) of the cue, the code(s) of the probe and the new
+# code for the probe. You could also demand that the probe follows the cue within
+# a certain time by adding, for instance, within=2000 (in ms) to a pattern and
+# passing the sampling rate to compile_sequences.
+patterns = [sequence(first=70, then=76, code=1),            # AX
+            sequence(first=codes_B, then=76, code=2),       # BX
+            sequence(first=70, then=codes_Y, code=3),       # AY
+            sequence(first=codes_B, then=codes_Y, code=4)]  # BY
+
+# compile_sequences turns the patterns into a function that searches the whole
+# event array at once. Once a cue is found, the next probe is recoded according
+# to that cue, no matter which other events (e.g. responses) lie in between.
+# Cues that follow a cue before a probe appeared are ignored.
+match_dpx = compile_sequences(patterns, sfreq=raw.info['sfreq'])
+events = match_dpx(events)
+
+# If you want to know how this works step by step, this is what the matcher does
+# for you: go through the events one by one, note the type of cue (A or B) when you
+# find one and nothing is noted yet, and when the next probe comes along, give it
+# the code for the noted cue and probe type and forget the cue again.
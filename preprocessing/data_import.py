@@ -138,7 +138,8 @@ events = mne.find_events(raw, stim_channel='Stim', output='onset',
 # your research. For instance, in my EEG-fMRI thesis I was predominantely looking for frequencies 
 # in the range of 1 to 12 Hz. Thus, I want to avoid blurred edges around these frequencies and, of course, 
 # I want to pick the filter cut-offs in manner that leaves my frequencies of interest untouched.
-raw.filter(0.1, 30, n_jobs=1, fir_design='firwin') 
+l_freq, h_freq = 0.1, 30
+raw.filter(l_freq, h_freq, n_jobs=1, fir_design='firwin') 
 
 # As a new reference and a general recommendation, I suggest an average reference for the 64-channel system 
 # from the lab in the Department of Psychology. References can attenuate very specific changes in the EEG.
@@ -149,7 +150,8 @@ raw.filter(0.1, 30, n_jobs=1, fir_design='firwin')
 raw.set_eeg_reference(ref_channels=['TP9','TP10']) 
 
 # ... or
-raw.set_eeg_reference(ref_channels='average') 
+ref_channels = 'average'
+raw.set_eeg_reference(ref_channels=ref_channels) 
 
 # Imagine your EEG data as it was during the recording, a collection of time points by channel in microvolt. Instead of
 # several colorful graphs, you now have a numpy array with rows and columns containing spatial data (electrodes) over time
@@ -170,3 +172,27 @@ raw.get_data(picks=picks, start=0, stop=None, return_times=False)
 # If you want to save a file you have been working on, use the .save function for instances of raw or epochs. Mind
 # the respective naming conventions for these file types in MNE ('-raw.fif', '-epo.fif', '-ave.fif', '-eve.fif', etc).
 raw.save('Sub1-raw.fif', picks=picks, overwrite=True)
+
+# To let the later scripts know which recording and which parameters the saved file comes from, note them in the stage
+# cache (see stage_cache.py). The manifest written next to the file ('Sub1-raw.fif.stage.json') makes the keys of the
+# epochs and ERPs computed from it in epoch_average_export.py depend on them, so that changing e.g. the filter band
+# here means the epochs are cut again the next time that script runs. This script itself is meant to be stepped
+# through (and its plots looked at), so it is always run in full rather than skipped by the cache. The parameters are
+# the same variables that were passed to raw.filter and raw.set_eeg_reference above, so the manifest can't note
+# anything other than what was run.
+from stage_cache import StageCache
+
+StageCache().record('import', dict(l_freq=l_freq, h_freq=h_freq, ref_channels=ref_channels), [data_path],
+                    'Sub1-raw.fif')
+
+# Simultaneous EEG-fMRI recordings at 5000 Hz quickly take up several GB, and with preload=True all of it has to fit
+# into memory (and the filter needs another copy). For these recordings, open the file without preloading and let
+# process_chunked from chunked_raw.py filter, re-reference and down-sample it in blocks of a few seconds. All three
+# steps happen in one sweep over the data, with the reference subtracted at the new, lower sampling rate. The result
+# is written to a .npy file on disk and opened again without loading it into memory.
+from chunked_raw import process_chunked, load_chunked
+
+raw = mne.io.read_raw_brainvision('./Sub1.vhdr', preload=False)
+process_chunked(raw, './Sub1-filt.npy', l_freq=l_freq, h_freq=h_freq, ref_channels=['TP9', 'TP10'], sfreq_new=250,
+                chunk_duration=10.)
+raw = load_chunked('./Sub1-filt.npy')
@@ -12,73 +12,155 @@ Created on Mon Jun 11 17:00:16 2018
 import mne
 
 import glob
+import json
 import os
 
 import pandas as pd
 import numpy as np
 
+from columnar_export import export_epochs
+from epoch_rejection import reject_epochs
+from epochs_store import EpochsStore, save_epochs_store
+from evoked_accumulator import EvokedAccumulator, read_accumulator
+from instrumentation import Profiler, summarize
+from stage_cache import StageCache
+
 output_dir = 'your output directory for epochs'
 data_path = 'your path to all your pre-processed files'     
+
+# The profiler notes how long each step takes for each subject, how much memory it needs and how many bytes it reads
+# and writes (see instrumentation.py). With enabled=False, it only measures the time.
+profiler = Profiler(output_dir + 'profile.jsonl', enabled=True)
+
+
+def epoch_subject(raw_file, epochs_file, event_id, tmin, tmax, sfreq, reject, flat, z_threshold):
+    # The epoching stage: read the pre-processed recording, cut and clean the epochs and save them, together with the
+    # rejection log, the epochs store and the sums of the epochs of every condition.
+    filename = os.path.basename(epochs_file)[:-len('-epo.fif')]
+
+    # Read the raw EEG data that has been pre-processed, create an event file and down-sample the data for easier
+    # handling. The events are resampled along with the data, so that their samples still match.
+    with profiler.stage('read', filename):
+        raw = mne.io.read_raw_fif(raw_file, preload=True)
+        events = mne.find_events(raw, stim_channel='Stim', output='onset', min_duration=0.002)
+
+    # The original samling rate has to be multiple of the new lower sampling rate. For 1024 Hz choose 256 Hz
+    # and for 5000 Hz sample data down to 250 Hz.
+    with profiler.stage('resample', filename):
+        raw, events = raw.resample(sfreq, npad="auto", events=events)
+    # Resampling is another full pass over data that were already filtered in a separate pass before. For recordings
+    # at high sampling rates, process_chunked from chunked_raw.py does the filtering, re-referencing and resampling
+    # in a single sweep instead (see the end of data_import.py).
+
+    # Epoch the preprocessed data and save the data as fif, for later uses of unaveraged epochs. Do not perform a
+    # baseline correction at this point, since you might want to use different baselines for different analyses
+    # (i.e., time-frequency analysis). The epochs are cut from the raw data once and kept in memory (preload=True),
+    # and the rejection, saving and the store below all use them from there. Without preload, each of these steps would
+    # cut them from the raw data again. The raw data are in memory anyway, and the epochs usually take up less.
+    with profiler.stage('epoch', filename):
+        epochs = mne.Epochs(raw, events, event_id=event_id, tmin=tmin, tmax=tmax, baseline=None, preload=True)
+    # Drop epochs with artifacts before saving them (see epoch_rejection.py). The log of which epochs were dropped and
+    # why is saved next to the epochs.
+    with profiler.stage('reject', filename):
+        rejection_log = reject_epochs(epochs, reject=reject, flat=flat, z_threshold=z_threshold)
+        print(rejection_log.summary())
+        with open(epochs_file[:-len('-epo.fif')] + '-rejection.json', 'w') as fid:
+            json.dump(rejection_log.to_dict(), fid)
+    with profiler.stage('save', filename):
+        epochs.save(epochs_file, overwrite=True)
+    # Also keep a copy sorted by condition, from which single conditions can be read without loading the whole file
+    # (see epochs_store.py).
+    with profiler.stage('store', filename):
+        save_epochs_store(epochs, epochs_file[:-len('-epo.fif')] + '-store.npy')
+    # Instead of selecting and averaging the trials of every condition separately, the sums of all conditions are
+    # collected in one pass over the epochs that are in memory now (see evoked_accumulator.py). Only the sums are
+    # saved; the averages are taken from them in the averaging stage.
+    with profiler.stage('accumulate', filename):
+        accumulator = EvokedAccumulator(epochs.info, epochs.tmin, event_id)
+        accumulator.add_epochs(epochs)
+        accumulator.save(epochs_file[:-len('-epo.fif')] + '-sums.npz')
+
+
+def average_subject(epochs_file, evoked_file, baseline):
+    # The averaging stage: average the epochs of every condition from the sums saved next to the epochs and save the
+    # ERPs. The trials are not read again, so changing the baseline only takes this stage.
+    filename = os.path.basename(evoked_file)[:-len('-ave.fif')]
+
+    # Average epoched data over conditions and apply baseline correction for Event-Related Potentials.
+    with profiler.stage('average', filename):
+        accumulator = read_accumulator(epochs_file[:-len('-epo.fif')] + '-sums.npz')
+        # ERPs locked on the onset of any music stimulus and specifically to the onset of heavy metal and modern classic
+        # music stimuli.
+        evokeds = [accumulator.evoked(condition, baseline=baseline)
+                   for condition in ('music_onset', 'heavy_metal', 'modern_classic')]
+        mne.write_evokeds(evoked_file, evokeds, overwrite=True)
+    # The difference between two genres comes from the same sums, without going through the trials again:
+    #   evoked_metal_classic = accumulator.difference('heavy_metal', 'modern_classic', baseline=baseline)
+
+
+# Epoching and averaging are stages of the stage cache (see stage_cache.py). A subject's epochs are only cut again if
+# the pre-processed file or one of the epoching parameters changed, and the ERPs are only averaged again if the epochs
+# did. The key of each stage includes the key of the stage that wrote its input, so when the pre-processed files were
+# written through the cache as well (see the end of data_import.py), a change further up the chain also reaches the
+# epochs and ERPs. Delete a manifest ('...-epo.fif.stage.json') to force a stage to run again.
+cache = StageCache()
+
+# Define the stimulus labels for epoching by assigning numbers to labels. In the MNE event structure there are
+# three columns: onsets in samples, previous_event_id  and event_id. By providing new id's you can ease epoching.
+event_id = {'music_onset': 1, 'heavy_metal': 2, 'modern_classic': 3}
+
 for file in glob.glob(os.path.join(data_path, '*.fif')):
-    
+
     filepath, filename = os.path.split(file)
     filename, ext = os.path.splitext(filename)
-    
+
     # Each time the loop goes through a new iteration, 
     # add a subject integer to the data path
     data_path = '/Volumes/INTENSO/DPX_EEG_fMRI/EEG/'
 
-    # Read the raw EEG data that has been pre-processed, create an event file and down-sample the data for easier handling.
-    raw = mne.io.read_raw_fif(file, events=None, event_id=None, preload=True)
-    events = mne.find_events(raw, stim_channel='Stim', output='onset', min_duration=0.002)
-    
-    # The original samling rate has to be multiple of the new lower sampling rate. For 1024 Hz choose 256 Hz
-    # and for 5000 Hz sample data down to 250 Hz.
-    raw.resample(256, npad="auto") 
-    
-    # Define the stimulus labels for epoching by assigning numbers to labels. In the MNE event structure there are 
-    # three columns: onsets in samples, previous_event_id  and event_id. By providing new id's you can ease epoching.
-    event_id = {'music_onset': 1, 'heavy_metal': 2, 'modern_classic': 3}
-    
-    # Epoch the preprocessed data with a baseline of -2000 ms and 2500 ms after the stimulus onset,
-    # and save the data as fif, for later uses of unaveraged epochs. Do not perform a baseline correction at this point,
-    # since you might want to use different baselines for different analyses (i.e., time-frequency analysis).
-    epochs = mne.Epochs(raw, events, event_id=event_id, tmin=-0.5, tmax=1.0)
-    epochs.save(output_dir + filename + '-epo.fif')
-    
-    # Average epoched data over conditions and apply baseline correction for Event-Related Potentials.
-    evoked_music = epochs['music_onset'].average() # Derive ERPs locked on the onset of any music stimulus.
-    evoked_cueA.apply_baseline(-0.25, 0) # Apply a baseline correction with a time window of -250 ms till the event onset.
-    evoked_metal = epochs['heavy_metal'].average() # Derive ERPs locked specifically to the onset of heavy 
-                                                    # metal music stimuli.
-    evoked_metal.apply_baseline(-0.25, 0)
-    evoked_classic = epochs['modern_classic'].average() # Derive ERPs locked specifically to the onset of modern 
-                                                        # classic music stimuli.
-    evoked_classic.apply_baseline(-0.25, 0)
-    evoked.save(output_dir + filename + '-ave.fif')
-    
+    # Epochs from -500 ms to 1000 ms around the stimulus onset at 256 Hz. Epochs with a peak-to-peak amplitude above
+    # 150 µV (EEG) or 250 µV (EOG), with a flat EEG channel or with a much larger variance than the other epochs of a
+    # channel are dropped.
+    epochs_file = output_dir + filename + '-epo.fif'
+    cache.run('epoch', epoch_subject, [file], epochs_file, event_id=event_id, tmin=-0.5, tmax=1.0, sfreq=256,
+              reject=dict(eeg=150e-6, eog=250e-6), flat=dict(eeg=1e-6), z_threshold=5.)
+
+    # ERPs with a baseline correction with a time window of -250 ms till the event onset.
+    evoked_file = output_dir + filename + '-ave.fif'
+    cache.run('average', average_subject, [epochs_file], evoked_file, baseline=(-0.25, 0))
+
 # For higher-level analyses it is adivsable to export data frames with your averaged or epoched data, 
 # especially if you intend to perform them in a different programming environment like R.
 
-# In this example, I want to save all epochs for music onsets, convert them to pandas data frames after loading
-# and append them to a larger data frame containing all epochs from all subjects. This data frame is then saved to a .csv.
+# In this example, I want to save all epochs for music onsets of all subjects. Appending each subject's data frame to
+# one large data frame and saving it as a .csv file gets slow for many subjects and the file becomes huge. Instead,
+# each subject's epochs are written to a Parquet dataset as soon as they are loaded (see columnar_export.py), which
+# can be read in R with arrow::open_dataset('./eeg_epochs/') or in pandas with read_epochs_dataset.
 
-for filename in glob.glob(os.path.join(output_dir, '*epo.fif')):
-    index, scaling_time = ['epoch', 'time'], 1e3
-    current_epochs = mne.read_epochs(filename)
-    df = current_epochs['music_onset'].to_data_frame(picks=None, scalings=None, scaling_time=scaling_time, index=index)  
-    if filename == 'first filename':
-        df_all_epochs = df
-    else:
-        df_all_epochs = df_all_epochs.append(df)
+# Only the music onset epochs are read from each subject's store, not all epochs in the -epo.fif file.
+for filename in glob.glob(os.path.join(output_dir, '*-store.npy')):
+    scaling_time = 1e3
+    current_epochs = EpochsStore(filename)
+    subject = os.path.basename(filename)[:-len('-store.npy')]
+    with profiler.stage('export', subject):
+        export_epochs(current_epochs['music_onset'], './eeg_epochs/', subject=subject, condition='music_onset',
+                      scaling_time=scaling_time)
 
-df_all_epochs.to_csv('./eeg_epochs.csv')
+# Time, CPU time, peak memory and bytes read and written of each step summed over all subjects, and a timeline of
+# all steps that can be opened in Chrome (chrome://tracing) or at https://ui.perfetto.dev.
+for stage, total in summarize(profiler.read_records()).items():
+    print('%-10s %8.1f s %8.1f s CPU %8.0f MB peak %8.0f MB read %8.0f MB written' % (
+        stage, total['wall_seconds'], total['cpu_seconds'], total['peak_rss'] / 1e6, total['bytes_read'] / 1e6,
+        total['bytes_written'] / 1e6))
+profiler.save_chrome_trace(output_dir + 'profile-trace.json')
 
-# You can plot averaged results with topoplots at specific time points with the following.
+# You can plot averaged results with topoplots at specific time points with the following, here the ERPs of the last
+# subject.
+evoked_music = mne.read_evokeds(evoked_file, condition='music_onset')
 ts_args = dict(gfp=True, zorder='std',
                ylim =dict(eeg=[-10,10]), unit=True)
 topomap_args = dict(sensors=False, vmax=8, vmin=-8, average=0.025, contours=2)
-music_example = evoked.plot_joint(title=None, times=[0, .1, .2, .3, .4, .5, .6, 1.],
+music_example = evoked_music.plot_joint(title=None, times=[0, .1, .2, .3, .4, .5, .6, 1.],
                        ts_args=ts_args, topomap_args=topomap_args)
 music_example.savefig('./music_gfp_stim_channel.pdf', bbox_inches='tight')
 
@@ -0,0 +1,227 @@
+"""
+Created on Mon Oct 19 21:14:37 2026
+
+@author: Malte Güth
+"""
+
+# Dropping bad epochs automatically instead of looking through every trial. While the epochs are cut from the raw
+# data, three measures are computed for every epoch and channel (as array operations on a batch of epochs x channels x
+# sample points, without a loop over epochs):
+#   - the peak-to-peak amplitude (largest minus smallest value), which catches large artifacts such as movements,
+#     like the reject argument of mne.Epochs,
+#   - flatness, i.e. a peak-to-peak amplitude below a minimum, which catches channels that lost contact, like flat,
+#   - the z-score of the variance of an epoch compared to all epochs of the same channel, which catches epochs that are
+#     much noisier than the rest of the recording (e.g. muscle activity) without a fixed threshold.
+#
+#   epochs = mne.Epochs(raw, events, event_id, tmin=-0.5, tmax=1.)
+#   log = reject_epochs(epochs, reject=dict(eeg=150e-6, eog=250e-6), flat=dict(eeg=1e-6), z_threshold=4.)
+#   print(log.summary())
+#
+# The epochs don't have to be preloaded. Then reject_epochs cuts them from the raw data in batches of batch_size
+# epochs and keeps only the measures, so the epochs never have to fit into memory at once. (MNE's drop_bad cuts them
+# once more before that, to find the epochs that reach beyond the recording, so that the positions of the epochs are
+# final before any of them is dropped.)
+#
+# Thresholds are given per channel type, as for mne.Epochs. With reject='auto' (or 'auto' for a single channel type,
+# e.g. reject=dict(eeg='auto', eog=250e-6)), the threshold adapts to the recording: it is factor times the percentile
+# of the peak-to-peak amplitudes of all epochs and channels of that type (by default twice the 95th percentile). For
+# flat, 'auto' works the other way round: the threshold is the (100 - percentile)th percentile divided by factor (by
+# default half the 5th percentile), so only epochs far below the usual amplitude of a channel type count as flat.
+#
+# The z-scores are computed from the logarithm of the variances, and they are robust, i.e. computed from the median and
+# the median absolute deviation instead of the mean and standard deviation, so a few very bad epochs can't hide each
+# other. reject_epochs drops the bad epochs from the epochs (the reasons show up in epochs.plot_drop_log()) and returns
+# a RejectionLog, which notes for every dropped epoch the channels and measures that were responsible.
+
+import collections
+
+import numpy as np
+
+import mne
+
+MEASURES = ('ptp', 'flat', 'variance')
+
+
+def epoch_measures(data, variance=True):
+    """Peak-to-peak amplitude and variance of every epoch and channel of data (n_epochs x n_channels x n_times).
+
+    The variance is None with variance=False.
+    """
+    data = np.asarray(data)
+    ptp = data.max(axis=-1) - data.min(axis=-1)
+    if not variance:
+        return ptp, None
+    # Sum and sum of squares in one pass each instead of data.var, which needs three. Subtracting the first sample
+    # first keeps large offsets (e.g. of data that were not high-pass filtered) from cancelling out the variance.
+    shifted = data - data[..., :1]
+    n_times = data.shape[-1]
+    mean = shifted.sum(axis=-1) / n_times
+    return ptp, np.einsum('...t,...t->...', shifted, shifted) / n_times - mean ** 2
+
+
+def robust_zscore(values, axis=0):
+    """Z-scores of values along axis, computed with the median and the (scaled) median absolute deviation."""
+    median = np.median(values, axis=axis, keepdims=True)
+    # 1.4826 x MAD is the standard deviation for normally distributed values.
+    mad = 1.4826 * np.median(np.abs(values - median), axis=axis, keepdims=True)
+    return (values - median) / np.where(mad > 0, mad, np.inf)
+
+
+def channel_thresholds(info, thresholds, ptp=None, percentile=95., factor=2., lower=False):
+    """Threshold of every channel of info from a dict of channel type -> threshold (np.nan where there is none).
+
+    thresholds can be 'auto' (or have 'auto' values), which need the peak-to-peak amplitudes ptp
+    (n_epochs x n_channels) to compute the adaptive threshold of each channel type. With lower=True (for flat), the
+    adaptive threshold is the (100 - percentile)th percentile divided by factor instead of percentile times factor.
+    """
+    types = np.array([mne.channel_type(info, idx) for idx in range(len(info['ch_names']))])
+    if thresholds == 'auto':
+        thresholds = dict((ch_type, 'auto') for ch_type in set(types) - set(['stim']))
+    per_channel = np.full(len(types), np.nan)
+    for ch_type, threshold in (thresholds or {}).items():
+        mask = types == ch_type
+        if not mask.any():
+            continue
+        if threshold == 'auto' and lower:
+            threshold = np.percentile(ptp[:, mask], 100. - percentile) / factor
+        elif threshold == 'auto':
+            threshold = factor * np.percentile(ptp[:, mask], percentile)
+        per_channel[mask] = threshold
+    return per_channel
+
+
+class RejectionLog(object):
+    """Which epochs were marked as bad, and why.
+
+    bad is a boolean array with one entry per epoch. reasons maps the index of every bad epoch to a list of
+    (channel, measure) pairs, with measure being 'ptp', 'flat' or 'variance'. thresholds holds the peak-to-peak and
+    flatness thresholds that were used for each channel.
+    """
+
+    def __init__(self, ch_names, masks, thresholds, z_threshold):
+        self.ch_names = list(ch_names)
+        self.masks = masks
+        self.thresholds = thresholds
+        self.z_threshold = z_threshold
+        bad_channels = np.zeros_like(masks['ptp'])
+        for mask in masks.values():
+            bad_channels |= mask
+        self.bad = bad_channels.any(axis=1)
+        self.reasons = collections.OrderedDict()
+        for epoch in np.where(self.bad)[0]:
+            self.reasons[int(epoch)] = [(self.ch_names[ch], measure) for measure in MEASURES
+                                        for ch in np.where(masks[measure][epoch])[0]]
+
+    @property
+    def bad_epochs(self):
+        return np.where(self.bad)[0]
+
+    def channel_counts(self):
+        """Number of bad epochs per channel and measure, for the channels with at least one."""
+        counts = collections.OrderedDict()
+        for measure in MEASURES:
+            for ch, count in enumerate(self.masks[measure].sum(axis=0)):
+                if count:
+                    counts.setdefault(self.ch_names[ch], collections.OrderedDict())[measure] = int(count)
+        return counts
+
+    def summary(self):
+        lines = ['%d of %d epochs marked as bad (%.1f %%)' % (self.bad.sum(), len(self.bad),
+                                                               100. * self.bad.mean() if len(self.bad) else 0.)]
+        for measure in MEASURES:
+            lines.append('  %-8s %d epochs' % (measure, self.masks[measure].any(axis=1).sum()))
+        for ch_name, counts in self.channel_counts().items():
+            lines.append('  %-8s %s' % (ch_name, ', '.join('%s %d' % item for item in counts.items())))
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        # A compact version for json.dump: only the bad epochs and the thresholds of the channels that have one.
+        return dict(n_epochs=len(self.bad), bad_epochs=[int(epoch) for epoch in self.bad_epochs],
+                    reasons=dict((str(epoch), reasons) for epoch, reasons in self.reasons.items()),
+                    thresholds=dict((measure, dict((name, float(value)) for name, value
+                                                   in zip(self.ch_names, values) if not np.isnan(value)))
+                                    for measure, values in self.thresholds.items()),
+                    z_threshold=self.z_threshold)
+
+
+def _data_picks(info):
+    # All channels except stim channels.
+    return mne.pick_types(info, meg=True, eeg=True, eog=True, ecg=True, emg=True, seeg=True, ecog=True, misc=True,
+                          exclude=[])
+
+
+def mark_bad_epochs(ptp, variance, info, reject=None, flat=None, z_threshold=None, percentile=95., factor=2.):
+    """Mark bad epochs from their peak-to-peak amplitudes and variances (n_epochs x n_channels of info).
+
+    variance is only needed with a z_threshold. The arguments are those of find_bad_epochs. Returns a RejectionLog.
+    """
+    thresholds = dict(ptp=channel_thresholds(info, reject, ptp, percentile, factor),
+                      flat=channel_thresholds(info, flat, ptp, percentile, factor, lower=True))
+    # Comparisons with nan are False, so channels without a threshold are never marked.
+    with np.errstate(invalid='ignore'):
+        masks = dict(ptp=ptp > thresholds['ptp'], flat=ptp < thresholds['flat'])
+    if z_threshold is not None:
+        # The log makes the skewed distribution of variances roughly symmetric. Flat channels (variance 0) get -inf
+        # and are left to the flat threshold.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            masks['variance'] = robust_zscore(np.log(variance), axis=0) > z_threshold
+    else:
+        masks['variance'] = np.zeros_like(masks['ptp'])
+    return RejectionLog(info['ch_names'], masks, thresholds, z_threshold)
+
+
+def find_bad_epochs(data, info, reject=None, flat=None, z_threshold=None, percentile=95., factor=2., picks=None):
+    """Mark bad epochs in data (n_epochs x n_channels x n_times) with the channels of info.
+
+    reject and flat are dicts of channel type -> peak-to-peak threshold (or 'auto'), z_threshold the largest allowed
+    robust z-score of the log variance of an epoch. picks restricts all measures to these channels (by default all
+    channels except stim channels). Returns a RejectionLog.
+    """
+    data = np.asarray(data)
+    picks = np.asarray(_data_picks(info) if picks is None else picks, dtype=int)
+    ptp, variance = epoch_measures(data[:, picks], variance=z_threshold is not None)
+    return mark_bad_epochs(ptp, variance, mne.pick_info(info, picks), reject, flat, z_threshold, percentile, factor)
+
+
+def _batch_measures(epochs, picks, variance=True, batch_size=64):
+    # epoch_measures of all epochs, cut from the raw data batch_size epochs at a time if they were not preloaded.
+    if epochs.preload:
+        return epoch_measures(epochs.get_data()[:, picks], variance)
+    # Epochs MNE rejects (e.g. because they reach beyond the recording) are dropped first, so that the positions of
+    # the batches are those of the epochs that are kept.
+    epochs.drop_bad(verbose=False)
+    ptps, variances = [], []
+    for start in range(0, len(epochs), batch_size):
+        ptp, var = epoch_measures(epochs[start:start + batch_size].get_data()[:, picks], variance)
+        ptps.append(ptp)
+        variances.append(var)
+    n_picks = len(picks)
+    if not ptps:
+        return np.zeros((0, n_picks)), np.zeros((0, n_picks)) if variance else None
+    return np.concatenate(ptps), np.concatenate(variances) if variance else None
+
+
+def reject_epochs(epochs, reject=None, flat=None, z_threshold=None, percentile=95., factor=2., picks=None,
+                  batch_size=64):
+    """Find bad epochs like find_bad_epochs and drop them from epochs (in place). Returns the RejectionLog.
+
+    Epochs that were not preloaded stay on disk; they are cut from the raw data batch_size epochs at a time. The drop
+    log of the epochs lists the channels responsible for each dropped epoch, as with mne.Epochs(reject=...).
+    """
+    picks = np.asarray(_data_picks(epochs.info) if picks is None else picks, dtype=int)
+    ptp, variance = _batch_measures(epochs, picks, z_threshold is not None, batch_size)
+    log = mark_bad_epochs(ptp, variance, mne.pick_info(epochs.info, picks), reject, flat, z_threshold, percentile,
+                          factor)
+    if not log.bad.any():
+        return log
+
+    selection = epochs.selection.copy()
+    epochs.drop(log.bad_epochs, reason='REJECT', verbose=False)
+    drop_log = [list(entry) for entry in epochs.drop_log]
+    for epoch, reasons in log.reasons.items():
+        drop_log[selection[epoch]] = sorted(set(ch_name for ch_name, measure in reasons))
+    # Recent MNE versions keep the drop log as a tuple of tuples.
+    if isinstance(epochs.drop_log, tuple):
+        drop_log = tuple(tuple(entry) for entry in drop_log)
+    epochs.drop_log = drop_log
+    return log
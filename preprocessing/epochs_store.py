@@ -0,0 +1,140 @@
+"""
+Created on Sun Oct 18 21:47:09 2026
+
+@author: Malte Güth
+"""
+
+# Reading only the epochs of one condition (or a few channels) from disk. mne.read_epochs always reads all epochs of a
+# file, even if the script only needs epochs['music_onset'] for an average or a time-frequency analysis. The store
+# below saves the epochs as a memory-mapped .npy file instead, sorted by their event code, so the epochs of each
+# condition lie next to each other in the file. A small .json file next to it notes where the epochs of each event
+# code start and stop, and the measurement info is saved to a -info.fif file:
+#
+#   save_epochs_store(epochs, './epochs/sub-01-store.npy')
+#   store = EpochsStore('./epochs/sub-01-store.npy')
+#   epochs_music = store['music_onset']                  # only reads the music onset epochs
+#   data = store.get_data('heavy_metal', picks=['Cz'])   # only reads Cz of the heavy metal epochs
+#
+# Selecting a condition therefore only reads that condition's epochs, e.g. a quarter of the file for one of four
+# equally frequent conditions. The data are stored as they are returned by epochs.get_data(), i.e. with the baseline
+# correction applied when saving.
+
+import json
+import os
+
+import numpy as np
+
+import mne
+
+
+def _index_file(filename):
+    return os.path.splitext(filename)[0] + '.json'
+
+
+def _info_file(filename):
+    return os.path.splitext(filename)[0] + '-info.fif'
+
+
+def save_epochs_store(epochs, filename, batch_size=64, dtype=np.float64):
+    """Save epochs to filename (.npy), sorted by event code, together with an index of the codes and the info.
+
+    Epochs that were not preloaded are read batch_size epochs at a time, so they are never all in memory.
+    """
+    if not epochs.preload:
+        epochs.drop_bad()
+    # A stable sort keeps the epochs of each code in their original order.
+    order = np.argsort(epochs.events[:, 2], kind='mergesort')
+    codes = epochs.events[order, 2]
+    n_times = len(epochs.times)
+
+    # Remove the index of an earlier store first, so it doesn't count as complete while it is replaced.
+    if os.path.isfile(_index_file(filename)):
+        os.remove(_index_file(filename))
+    data = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype,
+                                     shape=(len(order), len(epochs.ch_names), n_times))
+    for start in range(0, len(order), batch_size):
+        data[start:start + batch_size] = epochs[order[start:start + batch_size]].get_data()
+    data.flush()
+    del data
+
+    info_file = _info_file(filename)
+    if os.path.isfile(info_file):
+        os.remove(info_file)
+    mne.io.write_info(info_file, epochs.info)
+
+    unique_codes, starts = np.unique(codes, return_index=True)
+    stops = np.append(starts[1:], len(codes))
+    index = dict(offsets={str(code): [int(start), int(stop)]
+                          for code, start, stop in zip(unique_codes, starts, stops)},
+                 event_id=epochs.event_id, events=epochs.events[order].tolist(),
+                 selection=epochs.selection[order].tolist(), tmin=float(epochs.tmin))
+    with open(_index_file(filename) + '.tmp', 'w') as fid:
+        json.dump(index, fid)
+    os.replace(_index_file(filename) + '.tmp', _index_file(filename))
+
+
+class EpochsStore(object):
+    """Epochs saved with save_epochs_store, read from disk only when a condition is selected.
+
+    store['music_onset'] returns the epochs of a condition as an MNE Epochs object, get_data returns the data of a
+    condition and a subset of channels as an array.
+    """
+
+    def __init__(self, filename):
+        with open(_index_file(filename)) as fid:
+            index = json.load(fid)
+        self.filename = filename
+        self.offsets = dict((int(code), tuple(offset)) for code, offset in index['offsets'].items())
+        self.event_id = index['event_id']
+        self.events = np.array(index['events'], dtype=int).reshape(-1, 3)
+        self.selection = np.array(index['selection'], dtype=int)
+        self.tmin = index['tmin']
+        self.info = mne.io.read_info(_info_file(filename))
+        self.data = np.load(filename, mmap_mode='r')
+
+    @property
+    def ch_names(self):
+        return self.info['ch_names']
+
+    def __len__(self):
+        return len(self.events)
+
+    def _slices(self, conditions):
+        # Event codes of the conditions (names of event_id, or a list of them) as slices into the file.
+        if conditions is None:
+            return [slice(0, len(self))]
+        if isinstance(conditions, str):
+            conditions = [conditions]
+        codes = sorted(set(self.event_id[condition] for condition in conditions))
+        return [slice(*self.offsets[code]) for code in codes if code in self.offsets]
+
+    def _picks(self, picks):
+        if picks is None:
+            return slice(None)
+        return [self.ch_names.index(pick) if isinstance(pick, str) else pick for pick in picks]
+
+    def get_data(self, conditions=None, picks=None):
+        """Data (n_epochs x n_channels x n_times) of the given conditions and channels (names or indices)."""
+        picks = self._picks(picks)
+        slices = self._slices(conditions)
+        if not slices:
+            return np.empty((0, len(self.data[0, picks]), self.data.shape[-1]))
+        # Reading the channels within each slice only touches the parts of the file that hold them.
+        return np.concatenate([self.data[epochs_slice][:, picks] for epochs_slice in slices])
+
+    def get_epochs(self, conditions=None, picks=None):
+        """The given conditions and channels as an MNE Epochs object (EpochsArray)."""
+        data = self.get_data(conditions, picks)
+        slices = self._slices(conditions)
+        events = np.concatenate([self.events[epochs_slice] for epochs_slice in slices])
+        # The positions of the epochs in the original epochs (epochs.selection), in the same order as the data.
+        selection = np.concatenate([self.selection[epochs_slice] for epochs_slice in slices])
+        info = self.info
+        if picks is not None:
+            info = mne.pick_info(info, self._picks(picks))
+        event_id = dict((name, code) for name, code in self.event_id.items() if code in set(events[:, 2]))
+        return mne.EpochsArray(data, info, events=events, tmin=self.tmin, event_id=event_id, baseline=None,
+                               selection=selection, verbose=False)
+
+    def __getitem__(self, conditions):
+        return self.get_epochs(conditions)
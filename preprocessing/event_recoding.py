@@ -0,0 +1,62 @@
+"""
+Created on Sun Oct 18 09:14:27 2026
+
+@author: Malte Güth
+"""
+
+# Re-assigning trigger codes in an MNE event array. Instead of looping over every event and comparing its code with a
+# long chain of if/elif statements, the old and new codes are put into a lookup table and all events are recoded at
+# once. This is shared by the epoching scripts, e.g.
+#
+#   events = recode_events(events, {71: 71, 72: 71, 73: 71, 74: 71, 75: 71}, unmapped='keep')
+#
+# Scripts outside this folder have to add it to their path first (see representational_similarity_analysis.py).
+
+import numpy as np
+
+# Codes up to this value are recoded with a plain lookup table indexed by the code, larger (or negative) codes with a
+# binary search over the sorted codes of the mapping.
+MAX_TABLE_SIZE = 2 ** 16
+
+
+def recode_events(events, mapping, unmapped='raise'):
+    """Return a copy of events with the codes in the third column replaced according to mapping.
+
+    mapping is a dict of {old code: new code}. unmapped decides what happens to events whose code is not in mapping:
+    'raise' raises a ValueError listing those codes, 'keep' leaves them unchanged and 'drop' removes them.
+    """
+    if unmapped not in ('raise', 'keep', 'drop'):
+        raise ValueError("unmapped has to be 'raise', 'keep' or 'drop', got %r." % (unmapped,))
+
+    events = np.array(events, copy=True)
+    codes = events[:, 2]
+    old = np.array(list(mapping.keys()), dtype=codes.dtype)
+    new = np.array(list(mapping.values()), dtype=codes.dtype)
+
+    if len(codes) == 0 or len(old) == 0:
+        mapped = np.zeros(len(codes), dtype=bool)
+        new_codes = codes
+    elif codes.min() >= 0 and old.min() >= 0 and max(codes.max(), old.max()) < MAX_TABLE_SIZE:
+        size = max(codes.max(), old.max()) + 1
+        table = np.arange(size, dtype=codes.dtype)
+        table[old] = new
+        known = np.zeros(size, dtype=bool)
+        known[old] = True
+        new_codes = table[codes]
+        mapped = known[codes]
+    else:
+        order = np.argsort(old)
+        old, new = old[order], new[order]
+        index = np.minimum(np.searchsorted(old, codes), len(old) - 1)
+        mapped = old[index] == codes
+        new_codes = np.where(mapped, new[index], codes)
+
+    if not mapped.all():
+        if unmapped == 'raise':
+            raise ValueError('No new code given for the event codes %s.'
+                             % ', '.join(str(code) for code in np.unique(codes[~mapped])))
+        elif unmapped == 'drop':
+            events, new_codes = events[mapped], new_codes[mapped]
+
+    events[:, 2] = new_codes
+    return events
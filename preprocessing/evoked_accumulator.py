@@ -0,0 +1,182 @@
+"""
+Created on Sun Oct 18 23:12:45 2026
+
+@author: Malte Güth
+"""
+
+# Averaging all conditions (and blocks) of an experiment in a single pass over the epochs. Calling
+# epochs[condition].average() for each condition reads the trials of that condition again, and with epochs that were
+# not preloaded, each call extracts them from the raw data again. The accumulator below instead keeps a running sum
+# and a count of trials for each event code while the epochs are read once. Every average is then the sum divided by
+# the count, and conditions that pool several event codes (e.g. epochs['reward_left', 'reward_right']) just add the
+# sums of those codes:
+#
+#   accumulator = EvokedAccumulator(epochs.info, epochs.tmin, event_id)
+#   accumulator.add_epochs(epochs)
+#   reward = accumulator.evoked(['reward_left', 'reward_right'], baseline=(-0.2, -0.1))
+#   difference = accumulator.difference(['reward_left', 'reward_right'], ['no_reward_left', 'no_reward_right'])
+#
+# Blocks of trials (e.g. the baseline and the TMS blocks of an experiment) are given as ranges of epoch positions,
+# like epochs[0:89], and get sums of their own during the same pass. Baseline corrections are applied to the averages,
+# which gives the same result as correcting every trial first, since both are linear.
+#
+# The sums can be saved and read again, so that the averages can be taken later (e.g. with another baseline) without
+# going through the trials again:
+#
+#   accumulator.save('./epochs/sub-01-sums.npz')
+#   accumulator = read_accumulator('./epochs/sub-01-sums.npz')
+
+import collections
+import json
+import os
+
+import numpy as np
+
+import mne
+
+
+def _info_file(filename):
+    return os.path.splitext(filename)[0] + '-info.fif'
+
+
+def _matching_names(event_id, conditions):
+    # Event names selected by conditions, with MNE's rules for tags: 'reward' selects 'reward/left' and 'reward/right'.
+    if isinstance(conditions, str):
+        conditions = [conditions]
+    names = []
+    for condition in conditions:
+        if condition in event_id:
+            matches = [condition]
+        else:
+            tags = set(condition.split('/'))
+            matches = [name for name in event_id if tags <= set(name.split('/'))]
+        if not matches:
+            raise KeyError('No event matches %r. The events are %s.' % (condition, sorted(event_id)))
+        names.extend(name for name in matches if name not in names)
+    return names
+
+
+class EvokedAccumulator(object):
+    """Running sums and counts of epochs for each event code of event_id, overall and within blocks.
+
+    blocks optionally maps block names to (start, stop) positions of epochs, where stop is excluded (None for the
+    end). info and tmin are those of the epochs.
+    """
+
+    def __init__(self, info, tmin, event_id, blocks=None):
+        self.info = info
+        self.tmin = tmin
+        self.event_id = dict(event_id)
+        self.codes = np.array(sorted(set(self.event_id.values())))
+        self.blocks = [None] + list(blocks or {})
+        # The first 'block' holds all epochs.
+        ranges = [(0, None)] + [tuple(blocks[name]) for name in self.blocks[1:]]
+        self.starts = np.array([start for start, stop in ranges], dtype=float)
+        self.stops = np.array([np.inf if stop is None else stop for start, stop in ranges], dtype=float)
+        self.n_epochs = 0
+        self.sums = None
+        self.counts = np.zeros((len(self.blocks), len(self.codes)), dtype=int)
+
+    def add(self, data, codes):
+        """Add epochs (n_epochs x n_channels x n_times) with their event codes, after the epochs added so far."""
+        data = np.asarray(data)
+        codes = np.asarray(codes)
+        if self.sums is None:
+            self.sums = np.zeros((len(self.blocks), len(self.codes)) + data.shape[1:])
+        positions = self.n_epochs + np.arange(len(data))
+
+        # One weight for every (block, event code) and epoch, so that all sums are updated with one matrix product.
+        in_block = (positions >= self.starts[:, np.newaxis]) & (positions < self.stops[:, np.newaxis])
+        is_code = codes == self.codes[:, np.newaxis]
+        weights = (in_block[:, np.newaxis] & is_code).astype(float)
+
+        self.sums += np.dot(weights.reshape(-1, len(data)),
+                            data.reshape(len(data), -1)).reshape(self.sums.shape)
+        self.counts += weights.sum(axis=-1).astype(int)
+        self.n_epochs += len(data)
+
+    def add_epochs(self, epochs, batch_size=64):
+        """Add MNE epochs in batches of batch_size. Epochs that were not preloaded are read from the raw data once."""
+        if epochs.preload:
+            data = epochs.get_data()
+            for start in range(0, len(data), batch_size):
+                self.add(data[start:start + batch_size], epochs.events[start:start + batch_size, 2])
+            return
+
+        # Iterating over epochs that are not preloaded extracts (and rejects) them one by one.
+        batch, codes = [], []
+        epochs_iter = iter(epochs)
+        while True:
+            try:
+                data, code = epochs_iter.__next__(return_event_id=True)
+            except StopIteration:
+                break
+            batch.append(data)
+            codes.append(code)
+            if len(batch) == batch_size:
+                self.add(batch, codes)
+                batch, codes = [], []
+        if batch:
+            self.add(batch, codes)
+
+    def save(self, filename):
+        """Save the sums and counts to filename (.npz) and the info next to it (-info.fif), see read_accumulator."""
+        info_file = _info_file(filename)
+        if os.path.isfile(info_file):
+            os.remove(info_file)
+        mne.io.write_info(info_file, self.info)
+        blocks = [[name, [int(start), None if np.isinf(stop) else int(stop)]]
+                  for name, start, stop in zip(self.blocks[1:], self.starts[1:], self.stops[1:])]
+        with open(filename, 'wb') as fid:
+            np.savez(fid, sums=np.zeros(0) if self.sums is None else self.sums, counts=self.counts,
+                     n_epochs=self.n_epochs, tmin=self.tmin, event_id=json.dumps(self.event_id),
+                     blocks=json.dumps(blocks))
+
+    def _sum(self, conditions, block=None):
+        block_index = self.blocks.index(block)
+        codes = sorted(set(self.event_id[name] for name in _matching_names(self.event_id, conditions)))
+        columns = np.searchsorted(self.codes, codes)
+        return self.sums[block_index, columns].sum(axis=0), self.counts[block_index, columns].sum()
+
+    def evoked(self, conditions, block=None, baseline=None, comment=None):
+        """Average of the epochs of conditions (an event name or list of names) as an MNE Evoked object.
+
+        block restricts the average to the epochs of one of the blocks.
+        """
+        total, count = self._sum(conditions, block)
+        if count == 0:
+            raise ValueError('There are no epochs of %s%s.' % (conditions, '' if block is None
+                                                                else ' in block %s' % block))
+        if comment is None:
+            comment = conditions if isinstance(conditions, str) else ' + '.join(conditions)
+        # Like epochs.average(), only the data channels (e.g. EEG but not EOG) are averaged.
+        picks = mne.pick_types(self.info, meg=True, eeg=True, seeg=True, ecog=True, exclude=[])
+        evoked = mne.EvokedArray(total[picks] / count, mne.pick_info(self.info, picks), tmin=self.tmin,
+                                 comment=comment, nave=int(count), verbose=False)
+        if baseline is not None:
+            evoked.apply_baseline(baseline, verbose=False)
+        return evoked
+
+    def evokeds(self, block=None, baseline=None):
+        """Averages of all event names that have epochs, as a dict of Evoked objects."""
+        return dict((name, self.evoked(name, block, baseline)) for name in sorted(self.event_id, key=self.event_id.get)
+                    if self._sum(name, block)[1] > 0)
+
+    def difference(self, conditions, other, block=None, baseline=None):
+        """Difference wave between the averages of conditions and other, like combine_evoked(..., [1, -1])."""
+        return mne.combine_evoked([self.evoked(conditions, block, baseline), self.evoked(other, block, baseline)],
+                                  weights=[1, -1])
+
+
+def read_accumulator(filename):
+    """Read the sums and counts saved with EvokedAccumulator.save."""
+    saved = np.load(filename)
+    # The blocks keep the order in which they were saved, which is the order of the sums.
+    blocks = collections.OrderedDict((name, tuple(block_range))
+                                     for name, block_range in json.loads(str(saved['blocks'])))
+    accumulator = EvokedAccumulator(mne.io.read_info(_info_file(filename)), float(saved['tmin']),
+                                    json.loads(str(saved['event_id'])), blocks)
+    accumulator.counts = saved['counts']
+    accumulator.n_epochs = int(saved['n_epochs'])
+    accumulator.sums = saved['sums'] if saved['sums'].size else None
+    return accumulator
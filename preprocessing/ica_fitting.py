@@ -0,0 +1,165 @@
+"""
+Created on Mon Oct 19 11:02:14 2026
+
+@author: Malte Güth
+"""
+
+# Faster ICA fitting. Fitting extended infomax takes most of the time of the pre-processing, and basic_data_cleaning.py
+# starts it from scratch (a random unmixing matrix) for every subject and session. fit_ica below speeds this up in
+# two ways:
+#   - Decimation is chosen automatically, so that ICA sees about n_samples sample points. A common rule of thumb is
+#     that ICA needs about 20 to 30 x n_components^2 samples; more only slow it down. By default, 30 x
+#     n_components^2 are used, e.g. 18750 samples for 25 components, which is decim=32 for 10 minutes at 1024 Hz.
+#   - The unmixing matrix can be warm-started from the ICA of another session of the same subject with the same
+#     montage (e.g. the baseline block of TBS_KB before the TMS blocks), instead of starting from scratch. The sources
+#     of both sessions are mostly the same (eyes, heart, brain areas), so infomax starts close to the solution and
+#     can start with a smaller learning rate, which needs fewer iterations.
+#
+#   ica, stats = fit_ica(raw_session1, n_components=25)
+#   ica.save('./Sub1_session1-ica.fif')
+#   ica, stats = fit_ica(raw_session2, n_components=25, previous='./Sub1_session1-ica.fif')
+#
+#   print(format_stats(stats))
+#
+# stats holds the decimation, the number of samples, the time spent on fitting and the number of infomax iterations.
+#
+# For a warm start, the unmixing matrix of the other session has to be translated into the principal components (PCA)
+# of this session, so fit_ica computes the PCA of the data. MNE's ICA.fit computes the same PCA again, since it has no
+# option to pass one in, so this costs the time of one PCA ('pca_seconds'), and only with a warm start. stats notes
+# whether both PCAs agree ('pca_match'); if they don't (e.g. because reject dropped some data in ICA.fit), the warm
+# start is only approximate. For the same reason, the PCA is not cached between runs: ICA.fit would compute it again
+# anyway, so a cache would not save any time.
+
+import collections
+import logging
+import math
+import time
+
+import numpy as np
+
+import mne
+from mne.preprocessing import ICA
+
+
+def auto_decim(n_times, n_components, n_samples=None):
+    """Decimation that leaves about n_samples sample points (by default 30 x n_components^2), at least 1."""
+    if n_samples is None:
+        n_samples = 30 * n_components ** 2
+    return max(int(n_times // n_samples), 1)
+
+
+def pre_whitener(info, data):
+    # Like ICA.fit without a noise covariance: every channel type is divided by the standard deviation of its data.
+    whitener = np.empty((len(data), 1))
+    types = np.array([mne.channel_type(info, pick) for pick in range(len(data))])
+    for ch_type in np.unique(types):
+        whitener[types == ch_type] = np.std(data[types == ch_type])
+    return whitener
+
+
+def compute_pca(data):
+    """Principal components of data (n_channels x n_samples) with the sign convention of MNE's (and sklearn's) PCA."""
+    mean = data.mean(axis=1)
+    u, s, vt = np.linalg.svd((data - mean[:, np.newaxis]).T, full_matrices=False)
+    # Flip each component, so that the largest absolute value of its time course (u) is positive.
+    signs = np.sign(u[np.argmax(np.abs(u), axis=0), np.arange(u.shape[1])])
+    return dict(mean=mean, components=vt * signs[:, np.newaxis],
+                explained_variance=s ** 2 / (data.shape[1] - 1))
+
+
+def warm_start_weights(previous, whitener, pca, n_components):
+    """Starting weights for infomax in this session's whitened principal components from a previous ICA.
+
+    The previous ICA's unmixing is first expressed for the (pre-whitened) channels and then projected onto the
+    principal components of this session.
+    """
+    unmixing = np.dot(previous.unmixing_matrix_, previous.pca_components_[:previous.n_components_])
+    # Channels of both sessions can be scaled differently by the pre-whitening.
+    unmixing = unmixing * (whitener / previous.pre_whitener_).T
+    components = pca['components'][:n_components]
+    return np.dot(unmixing, components.T) * np.sqrt(pca['explained_variance'][:n_components])
+
+
+class _StepCounter(logging.Filter):
+    # Counts the iteration messages of infomax. ICA.n_iter_ can't be used for this, since infomax reports max_iter as
+    # the number of iterations when it stops because the weights no longer change. infomax is made to log them with
+    # verbose=True, so the counter hides all of them, and every other message below the log level set before the fit
+    # (e.g. 'Computing Extended Infomax ICA').
+
+    def __init__(self, level):
+        logging.Filter.__init__(self)
+        self.level = level
+        self.n_steps = 0
+
+    def filter(self, record):
+        if record.getMessage().startswith('step '):
+            self.n_steps += 1
+            return False
+        return record.levelno >= self.level
+
+
+def fit_ica(raw, n_components=25, method='extended-infomax', picks=None, decim='auto', n_samples=None, reject=None,
+            previous=None, warm_rate=0.1, random_state=None):
+    """Fit ICA to raw with automatic decimation and optionally a warm start from a previous ICA.
+
+    picks default to the EEG and EOG channels, as in basic_data_cleaning.py. decim='auto' picks the decimation with
+    auto_decim. previous is an ICA (or the file name of one) of another session of the same subject and montage; it
+    is only used with infomax and if it has the same channels and number of components. A warm start uses warm_rate
+    times infomax's default learning rate. Returns the fitted ICA and a dict with statistics of the fit.
+    """
+    if picks is None:
+        picks = mne.pick_types(raw.info, meg=False, eeg=True, eog=True)
+    ch_names = [raw.ch_names[pick] for pick in picks]
+    if decim == 'auto':
+        decim = auto_decim(raw.n_times, n_components, n_samples)
+    if isinstance(previous, str):
+        previous = mne.preprocessing.read_ica(previous)
+
+    stats = collections.OrderedDict(decim=decim, n_samples=len(range(0, raw.n_times, decim)))
+    fit_params = dict()
+    infomax = method in ('infomax', 'extended-infomax')
+    stats['warm_start'] = (previous is not None and infomax and previous.ch_names == ch_names and
+                           previous.n_components_ == n_components)
+    pca = None
+    if stats['warm_start']:
+        start = time.time()
+        data = raw.get_data(picks=picks)[:, ::decim]
+        whitener = pre_whitener(mne.pick_info(raw.info, picks), data)
+        pca = compute_pca(data / whitener)
+        del data
+        stats['pca_seconds'] = time.time() - start
+        fit_params['weights'] = warm_start_weights(previous, whitener, pca, n_components)
+        # Close to the solution, the large steps of infomax's default learning rate would only move away from it.
+        fit_params['l_rate'] = warm_rate * 0.01 / math.log(n_components ** 2.)
+
+    # 'extended-infomax' is infomax with extended=True, which also works with MNE versions that dropped the name.
+    if method == 'extended-infomax':
+        method, fit_params['extended'] = 'infomax', True
+
+    counter = _StepCounter(mne.utils.logger.getEffectiveLevel())
+    if infomax:
+        # Let infomax log its iterations, which the counter counts and keeps off the screen.
+        fit_params['verbose'] = True
+        mne.utils.logger.addFilter(counter)
+    start = time.time()
+    try:
+        ica = ICA(n_components=n_components, method=method, fit_params=fit_params, random_state=random_state)
+        ica.fit(raw, picks=picks, decim=decim, reject=reject)
+    finally:
+        mne.utils.logger.removeFilter(counter)
+    stats['fit_seconds'] = time.time() - start
+    stats['n_iter'] = counter.n_steps if infomax else getattr(ica, 'n_iter_', None)
+    if pca is not None:
+        stats['pca_match'] = (len(ica.pca_components_) >= n_components and
+                              bool(np.allclose(ica.pca_components_[:n_components], pca['components'][:n_components],
+                                               atol=1e-6)))
+    return ica, stats
+
+
+def format_stats(stats):
+    """One line describing the statistics returned by fit_ica, e.g. to print them."""
+    line = 'ICA: %d samples (decim=%d), fit %.1f s, %s iterations' % (stats['n_samples'], stats['decim'],
+                                                                       stats['fit_seconds'], stats['n_iter'])
+    if stats['warm_start']:
+        line += ', warm start (PCA %.1f s%s)' % (stats['pca_seconds'], '' if stats['pca_match'] else ', PCA differs')
+    return line
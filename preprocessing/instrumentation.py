@@ -0,0 +1,253 @@
+"""
+Created on Mon Oct 19 19:06:42 2026
+
+@author: Malte Güth
+"""
+
+# Finding out where the time of a long pre-processing run goes. The scripts and pipeline_runner.py report each of their
+# steps (reading, filtering, resampling, ICA, saving, ...) to a Profiler, which notes for every step and subject:
+#   - the wall time and the CPU time (of all threads of the process, so numpy using several cores shows up as more CPU
+#     than wall time),
+#   - the peak memory (resident set size, RSS) during the step,
+#   - the bytes read from and written to files during the step.
+#
+#   profiler = Profiler('./profile.jsonl')
+#   with profiler.stage('filter', subject='Sub1'):
+#       raw.filter(0.5, 30., fir_design='firwin')
+#   profiler.save_chrome_trace('./profile-trace.json')
+#   print(summarize(profiler.read_records()))
+#
+# Every record is written to the JSON lines file as soon as its step is done, one line per step, so the file can be
+# read (e.g. with pandas.read_json(..., lines=True)) while a cohort is still running, and nothing is lost if the run
+# crashes. save_chrome_trace converts the records into a timeline that can be opened in Chrome (chrome://tracing) or at
+# https://ui.perfetto.dev, with one row per worker process and nested steps drawn below each other.
+#
+# Profiler(enabled=False) (or None wherever a function takes a profiler) only measures the wall time of each step,
+# which costs two clock readings.
+#
+# Peak memory and file I/O are read from /proc/self on Linux, where the peak is reset at the start of every step. On
+# other systems they need psutil (pip install psutil); without it, the peak RSS is the peak of the whole process so
+# far and bytes are not counted.
+
+import collections
+import json
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _read_proc(filename):
+    # Fields of /proc/self/status or /proc/self/io as a dict of name -> value, or None if the file can't be read.
+    try:
+        with open(filename) as fid:
+            return dict(line.split(':', 1) for line in fid if ':' in line)
+    except (IOError, OSError):
+        return None
+
+
+def reset_peak_rss():
+    """Reset the peak RSS of this process (Linux only), so the next reading is the peak from now on."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as fid:
+            fid.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes (since the last reset on Linux), or None."""
+    status = _read_proc('/proc/self/status')
+    if status is not None and 'VmHWM' in status:
+        return int(status['VmHWM'].split()[0]) * 1024
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss)
+    if resource is not None:
+        # ru_maxrss is in kB on Linux, but in bytes on macOS.
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname()[0] == 'Darwin' else maxrss * 1024
+    return None
+
+
+def io_counters():
+    """Bytes read and written by this process so far (including data served from the page cache), or (None, None)."""
+    counters = _read_proc('/proc/self/io')
+    if counters is not None:
+        return int(counters['rchar']), int(counters['wchar'])
+    if psutil is not None:
+        try:
+            counters = psutil.Process().io_counters()
+            return (getattr(counters, 'read_chars', counters.read_bytes),
+                    getattr(counters, 'write_chars', counters.write_bytes))
+        except (AttributeError, psutil.Error):
+            pass
+    return None, None
+
+
+class Stage(object):
+    """One step of a Profiler, used as a context manager. wall_seconds holds its duration once it is done."""
+
+    def __init__(self, profiler, name, subject, fields):
+        self.profiler = profiler
+        self.name = name
+        self.subject = subject
+        self.fields = fields
+        self.wall_seconds = None
+        self.peak = None
+
+    def __enter__(self):
+        if self.profiler.enabled:
+            stack = self.profiler._stack()
+            if stack:
+                # The peak of the enclosing step so far, before the reset below starts counting anew.
+                stack[-1].peak = max(stack[-1].peak or 0, peak_rss() or 0)
+            stack.append(self)
+            reset_peak_rss()
+            self.start_time = time.time()
+            self.start_cpu = time.process_time()
+            self.start_io = io_counters()
+            self.start_own = self.profiler._written
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_seconds = time.perf_counter() - self.start
+        if not self.profiler.enabled:
+            return False
+        cpu_seconds = time.process_time() - self.start_cpu
+        self.peak = max(self.peak or 0, peak_rss() or 0) or None
+        stop_io = io_counters()
+        # Records of nested steps written to the profiler's file don't count as I/O of this step.
+        own = self.profiler._written - self.start_own
+        stack = self.profiler._stack()
+        stack.pop()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak or 0, self.peak or 0)
+
+        record = collections.OrderedDict(stage=self.name, subject=self.subject, start=self.start_time,
+                                         wall_seconds=self.wall_seconds, cpu_seconds=cpu_seconds,
+                                         peak_rss=self.peak,
+                                         bytes_read=None if stop_io[0] is None else stop_io[0] - self.start_io[0],
+                                         bytes_written=None if stop_io[1] is None
+                                         else stop_io[1] - self.start_io[1] - own,
+                                         depth=len(stack), pid=os.getpid(), thread=threading.current_thread().ident,
+                                         run=self.profiler.run, failed=exc_type is not None)
+        record.update(self.fields)
+        self.profiler.add(record)
+        return False
+
+
+class Profiler(object):
+    """Collects the wall and CPU time, peak memory and file I/O of each step of a run.
+
+    Records are kept in records and, if filename is given, appended to that JSON lines file. With run_subjects from
+    pipeline_runner.py, each worker process gets a copy of the profiler and writes its records to the same file, so
+    give it a filename there. Every record notes the run it belongs to (by default the time the profiler was created
+    and the process id of the process that created it, which the workers share), so several runs can be appended to
+    the same file, even if they start within the same second.
+    """
+
+    def __init__(self, filename=None, enabled=True, run=None):
+        self.filename = filename
+        self.enabled = enabled
+        self.run = '%s-%d' % (time.strftime('%Y-%m-%dT%H:%M:%S'), os.getpid()) if run is None else run
+        self.records = []
+        self._local = threading.local()
+        self._written = 0
+
+    def __getstate__(self):
+        # Copies sent to worker processes start without records and with their own stack of steps.
+        return dict(filename=self.filename, enabled=self.enabled, run=self.run)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __repr__(self):
+        return 'Profiler(%r, enabled=%r)' % (self.filename, self.enabled)
+
+    def _stack(self):
+        # Steps that are running in this thread, the innermost last.
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def stage(self, name, subject=None, **fields):
+        """Measure the step name (of subject) in a with block. fields (e.g. n_channels=64) are added to the record."""
+        return Stage(self, name, subject, fields)
+
+    def add(self, record):
+        self.records.append(record)
+        if self.filename is not None:
+            # One write of one line per record, so workers appending to the same file don't mix their lines.
+            line = json.dumps(record) + '\n'
+            with open(self.filename, 'a') as fid:
+                fid.write(line)
+            self._written += len(line.encode('utf-8'))
+
+    def read_records(self):
+        """Records of this run, from all processes if the profiler has a file, otherwise those of this process."""
+        if self.filename is None or not os.path.isfile(self.filename):
+            return list(self.records)
+        return [record for record in read_records(self.filename) if record.get('run') == self.run]
+
+    def save_jsonl(self, filename):
+        """Write the records of this run to filename, one JSON object per line."""
+        with open(filename, 'w') as fid:
+            for record in self.read_records():
+                fid.write(json.dumps(record) + '\n')
+
+    def save_chrome_trace(self, filename):
+        """Write the records of this run as a Chrome trace to filename."""
+        save_chrome_trace(self.read_records(), filename)
+
+
+def read_records(filename):
+    """Records of a JSON lines file written by a Profiler."""
+    with open(filename) as fid:
+        return [json.loads(line) for line in fid if line.strip()]
+
+
+def save_chrome_trace(records, filename):
+    """Write records as a Chrome trace (the Trace Event Format) to filename."""
+    events = []
+    for record in records:
+        name = record['stage'] if record.get('subject') is None else '%s %s' % (record['stage'], record['subject'])
+        args = dict((key, value) for key, value in record.items()
+                    if key not in ('stage', 'start', 'wall_seconds', 'pid', 'thread', 'depth', 'run'))
+        # Complete events ('X') with start and duration in microseconds.
+        events.append(dict(name=name, cat=record.get('subject') or 'run', ph='X', ts=record['start'] * 1e6,
+                           dur=record['wall_seconds'] * 1e6, pid=record['pid'], tid=record['thread'], args=args))
+    with open(filename, 'w') as fid:
+        json.dump(dict(traceEvents=events, displayTimeUnit='ms'), fid)
+
+
+def summarize(records, by='stage'):
+    """Totals of wall time, CPU time and bytes per stage (or per subject with by='subject') and the largest peak RSS.
+
+    Only the outermost steps are counted for totals over nested steps, so that no time is counted twice.
+    """
+    totals = collections.OrderedDict()
+    for record in records:
+        key = record.get(by)
+        if key not in totals:
+            totals[key] = collections.OrderedDict(count=0, wall_seconds=0., cpu_seconds=0., peak_rss=0, bytes_read=0,
+                                                  bytes_written=0)
+        total = totals[key]
+        if by != 'stage' and record.get('depth', 0) > 0:
+            continue
+        total['count'] += 1
+        for name in ('wall_seconds', 'cpu_seconds', 'bytes_read', 'bytes_written'):
+            total[name] += record.get(name) or 0
+        total['peak_rss'] = max(total['peak_rss'], record.get('peak_rss') or 0)
+    return totals
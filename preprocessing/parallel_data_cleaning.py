@@ -0,0 +1,59 @@
+"""
+Created on Sat Oct 17 21:40:05 2026
+
+@author: Malte Güth
+"""
+
+# This script runs the loop from the end of basic_data_cleaning.py (filtering, re-referencing and ICA for all
+# subjects) on several subjects at the same time. On a machine with many cores, the whole cohort then takes about as
+# long as one ICA per worker instead of one ICA per subject.
+# Note that the code has to sit below "if __name__ == '__main__':". Each worker process imports this script and
+# would otherwise start its own set of workers.
+
+import glob
+import os
+
+from instrumentation import Profiler, summarize
+from pipeline_runner import clean_subject, run_subjects, summarize_timings
+from stage_cache import StageCache
+
+data_path = 'your path to all your raw files'
+output_dir = 'your output directory for ICA decompositions'
+
+
+def ica_file_for(raw_file):
+    # Sub1.bdf -> Sub1-ica.fif in the output directory
+    filename, ext = os.path.splitext(os.path.basename(raw_file))
+    return os.path.join(output_dir, filename + '-ica.fif')
+
+
+if __name__ == '__main__':
+
+    files = sorted(glob.glob(os.path.join(data_path, '*.bdf')))
+
+    # n_workers is the number of subjects processed at the same time (by default one per CPU core). With
+    # memory_budget, fewer subjects are loaded at once if their recordings would not fit into memory together,
+    # here 32 GB. Subjects are skipped if their ICA file was computed from the same raw file with the same parameters
+    # (see stage_cache.py). Change, for instance, the filter band and all subjects are processed again.
+    # The profiler notes time, memory and file I/O of every stage of every subject in profile.jsonl (see
+    # instrumentation.py).
+    profiler = Profiler(os.path.join(output_dir, 'profile.jsonl'))
+    results = run_subjects(clean_subject, files, ica_file_for, n_workers=None, memory_budget=32 * 1024 ** 3,
+                           cache=StageCache(), profiler=profiler,
+                           l_freq=0.5, h_freq=30., ref_channels='average',
+                           n_components=25, method='extended-infomax', decim=3,
+                           montage='biosemi64',
+                           read_kwargs=dict(eog=[u'EXG1', u'EXG2'],
+                                            exclude=[u'EXG3', u'EXG4', u'EXG5', u'EXG6', u'EXG7', u'EXG8']))
+
+    # Time spent on each stage summed over all subjects.
+    for stage, seconds in summarize_timings(results).items():
+        print('%-10s %8.1f s' % (stage, seconds))
+
+    # CPU time, peak memory and bytes read and written per stage, and a timeline of all workers that can be opened in
+    # Chrome (chrome://tracing) or at https://ui.perfetto.dev.
+    for stage, total in summarize(profiler.read_records()).items():
+        print('%-10s %8.1f s CPU %8.0f MB peak %8.0f MB read %8.0f MB written' % (
+            stage, total['cpu_seconds'], total['peak_rss'] / 1e6, total['bytes_read'] / 1e6,
+            total['bytes_written'] / 1e6))
+    profiler.save_chrome_trace(os.path.join(output_dir, 'profile-trace.json'))
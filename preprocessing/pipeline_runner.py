@@ -0,0 +1,173 @@
+"""
+Created on Sat Oct 17 21:12:48 2026
+
+@author: Malte Güth
+"""
+
+# Running the pre-processing of many subjects in parallel. The loops at the end of basic_data_cleaning.py process one
+# subject after the other, although ICA fitting only uses a fraction of a multi-core machine. The functions below
+# distribute subjects across a pool of worker processes. Since every worker holds a complete preloaded recording in
+# memory, the number of recordings processed at the same time is additionally capped by a memory budget. Subjects
+# whose output file is newer than their raw file are skipped, so an interrupted run can simply be started again.
+# See parallel_data_cleaning.py for an example.
+
+import collections
+import concurrent.futures
+import os
+import time
+
+import mne
+
+from ica_fitting import fit_ica
+from instrumentation import Profiler
+
+
+def read_raw_file(raw_file, **kwargs):
+    """Read a raw file of any format MNE knows (e.g. .bdf, .edf, .vhdr or .fif) by its extension."""
+    if hasattr(mne.io, 'read_raw'):
+        return mne.io.read_raw(raw_file, **kwargs)
+    # Before MNE 0.20, read_raw_edf also reads BioSemi .bdf files.
+    if os.path.splitext(raw_file)[1].lower() == '.fif':
+        return mne.io.read_raw_fif(raw_file, **kwargs)
+    return mne.io.read_raw_edf(raw_file, **kwargs)
+
+
+def clean_subject(raw_file, ica_file, l_freq=0.5, h_freq=30., ref_channels='average', n_components=25,
+                  method='extended-infomax', decim=3, montage=None, read_kwargs=None, previous_ica=None,
+                  profiler=None):
+    """Filter, re-reference and fit ICA for one subject, as in basic_data_cleaning.py, and save the ICA.
+
+    read_kwargs are passed to read_raw_file (e.g. eog and exclude). decim='auto' and previous_ica (the ICA file
+    of another session of the subject) are passed to fit_ica from ica_fitting.py. Each stage is reported to profiler
+    (see instrumentation.py), if given. Returns the time spent on each stage.
+    """
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+    subject = os.path.splitext(os.path.basename(raw_file))[0]
+    timings = collections.OrderedDict()
+
+    with profiler.stage('read', subject) as stage:
+        raw = read_raw_file(raw_file, preload=True, **(read_kwargs or {}))
+        if montage is not None:
+            raw.set_montage(montage)
+    timings['read'] = stage.wall_seconds
+
+    with profiler.stage('filter', subject) as stage:
+        raw.filter(l_freq, h_freq, n_jobs=1, fir_design='firwin')
+    timings['filter'] = stage.wall_seconds
+
+    with profiler.stage('reference', subject) as stage:
+        raw.set_eeg_reference(ref_channels=ref_channels)
+    timings['reference'] = stage.wall_seconds
+
+    with profiler.stage('ica', subject) as stage:
+        picks = mne.pick_types(raw.info, meg=False, eeg=True, eog=True)
+        ica, stats = fit_ica(raw, n_components=n_components, method=method, picks=picks, decim=decim,
+                             previous=previous_ica)
+        # The statistics of the fit (decimation, iterations, warm start) go into the profile of the stage.
+        stage.fields.update(stats)
+    timings['ica'] = stage.wall_seconds
+
+    with profiler.stage('save', subject) as stage:
+        ica.save(ica_file)
+    timings['save'] = stage.wall_seconds
+
+    return timings
+
+
+def estimate_raw_memory(raw_file):
+    # Bytes needed for a preloaded recording: channels x samples as float64, twice for the copy made while filtering.
+    try:
+        raw = read_raw_file(raw_file, preload=False, verbose=False)
+        return 2 * 8 * len(raw.ch_names) * raw.n_times
+    except (IOError, ValueError, NotImplementedError):
+        # Unknown formats: 24 bit samples on disk become 64 bit in memory.
+        return 2 * os.path.getsize(raw_file) * 8 // 3
+
+
+def _timed(func, *args, **kwargs):
+    # Runs in the worker, so the time doesn't include the time the subject waited in the pool's queue.
+    start = time.time()
+    result = func(*args, **kwargs)
+    return result, time.time() - start
+
+
+def is_up_to_date(input_file, output_file):
+    return os.path.isfile(output_file) and os.path.getmtime(output_file) >= os.path.getmtime(input_file)
+
+
+def run_subjects(func, files, output_for, n_workers=None, memory_budget=None, force=False,
+                 memory_for=estimate_raw_memory, cache=None, profiler=None, **kwargs):
+    """Run func(input_file, output_file, **kwargs) for all files in a pool of worker processes.
+
+    output_for maps an input file to its output file. Subjects with an up-to-date output are skipped unless force is
+    True. Without a cache, up to date means the output is newer than the input. With a StageCache from
+    stage_cache.py, the output also has to have been computed with the same kwargs and an unchanged input.
+
+    If memory_budget (in bytes) is given, a new subject is only started while the estimated memory of all running
+    subjects (see memory_for) stays within the budget; a single subject is always allowed to run.
+
+    A Profiler from instrumentation.py is passed on to func as profiler=profiler. It is not one of the kwargs, so
+    turning profiling on or off doesn't make the outputs of the cache outdated.
+
+    func has to return a dict of stage timings in seconds. The function returns a dict mapping every processed input
+    file to its timings, or to the exception it raised. The printed times are those spent in the worker, followed by
+    the turnaround time from submitting the subject to its result, which includes the time it waited for a worker.
+    """
+    stage = func.__name__
+    pending = collections.deque()
+    for input_file in files:
+        if cache is not None:
+            up_to_date = cache.is_current(stage, kwargs, [input_file], output_for(input_file))
+        else:
+            up_to_date = is_up_to_date(input_file, output_for(input_file))
+        if not force and up_to_date:
+            print('Skipping %s, output is up to date.' % input_file)
+        else:
+            pending.append(input_file)
+
+    results = collections.OrderedDict()
+    running = dict()
+    used_memory = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+        while pending or running:
+            # Start as many subjects as the memory budget allows.
+            while pending:
+                memory = memory_for(pending[0]) if memory_budget is not None else 0
+                if running and memory_budget is not None and used_memory + memory > memory_budget:
+                    break
+                input_file = pending.popleft()
+                if cache is not None:
+                    cache.invalidate(output_for(input_file))
+                func_kwargs = kwargs if profiler is None else dict(kwargs, profiler=profiler)
+                future = executor.submit(_timed, func, input_file, output_for(input_file), **func_kwargs)
+                running[future] = (input_file, memory, time.time())
+                used_memory += memory
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                input_file, memory, start = running.pop(future)
+                used_memory -= memory
+                try:
+                    results[input_file], seconds = future.result()
+                    if cache is not None:
+                        cache.record(stage, kwargs, [input_file], output_for(input_file))
+                    stages = ', '.join('%s %.1f s' % item for item in results[input_file].items())
+                    print('Finished %s in %.1f s, turnaround %.1f s (%s)' % (input_file, seconds, time.time() - start,
+                                                                            stages))
+                except Exception as exc:
+                    results[input_file] = exc
+                    print('Failed %s: %r' % (input_file, exc))
+
+    return results
+
+
+def summarize_timings(results):
+    # Total time per stage over all subjects that finished successfully.
+    totals = collections.OrderedDict()
+    for timings in results.values():
+        if isinstance(timings, Exception):
+            continue
+        for stage, seconds in timings.items():
+            totals[stage] = totals.get(stage, 0.) + seconds
+    return totals
@@ -0,0 +1,85 @@
+"""
+Created on Sun Oct 18 10:02:51 2026
+
+@author: Malte Güth
+"""
+
+# Finding sequences of events, like a cue followed by a probe, and giving the second event of each sequence a new
+# code. complex_epoching.py first does this with a for loop that remembers the last cue in a variable (temp_cue).
+# Here, the sequences are described as patterns instead:
+#
+#   patterns = [sequence(first=70, then=76, code=1),                 # AX
+#               sequence(first=[71, 72, 73, 74, 75], then=76, code=2)] # BX
+#   match = compile_sequences(patterns)
+#   events = match(events)
+#
+# The compiled matcher works on the whole event array at once. It follows the same rules as the loop: once a cue is
+# found, further cues are ignored until the next probe, and each probe is paired with that first pending cue. Only
+# the probes are recoded; cues and all other events keep their codes.
+
+import numpy as np
+
+
+def sequence(first, then, code, within=None):
+    """A pattern of an event with a code in first, followed by an event with a code in then.
+
+    The second event is recoded to code. If within is given (in ms), the second event has to follow the first one
+    within that time.
+    """
+    return dict(first=np.atleast_1d(first), then=np.atleast_1d(then), code=code, within=within)
+
+
+def compile_sequences(patterns, sfreq=None):
+    """Compile a list of patterns (see sequence) into a function that recodes an MNE event array.
+
+    sfreq is the sampling rate of the events and is required if any pattern uses within. The returned function takes
+    an event array and returns a recoded copy.
+    """
+    if sfreq is None and any(pattern['within'] is not None for pattern in patterns):
+        raise ValueError('sfreq is required for patterns with a time limit (within).')
+
+    first_codes = np.unique(np.concatenate([pattern['first'] for pattern in patterns]))
+    then_codes = np.unique(np.concatenate([pattern['then'] for pattern in patterns]))
+    if np.intersect1d(first_codes, then_codes).size:
+        raise ValueError('A code can either start or end a sequence, not both: %s'
+                         % np.intersect1d(first_codes, then_codes))
+
+    # Time limits in samples (infinite without a limit).
+    limits = [np.inf if pattern['within'] is None else pattern['within'] * sfreq / 1000.
+              for pattern in patterns]
+
+    def match(events):
+        events = np.array(events, copy=True)
+        codes = events[:, 2]
+        n_events = len(codes)
+        index = np.arange(n_events)
+
+        is_first = np.isin(codes, first_codes)
+        is_then = np.isin(codes, then_codes)
+
+        # For each event, the index of the last probe before it (-1 if there is none) ...
+        last_then = np.maximum.accumulate(np.where(is_then, index, -1))
+        previous_then = np.concatenate(([-1], last_then[:-1]))
+        # ... and for each position, the index of the next cue at or after it (n_events if there is none).
+        next_first = np.minimum.accumulate(np.where(is_first, index, n_events)[::-1])[::-1]
+        next_first = np.append(next_first, n_events)
+
+        # A probe is paired with the first cue after the previous probe, if that cue comes before the probe itself.
+        probes = index[is_then]
+        cues = next_first[previous_then[probes] + 1]
+        paired = cues < probes
+        probes, cues = probes[paired], cues[paired]
+
+        new_codes = codes.copy()
+        done = np.zeros(len(probes), dtype=bool)
+        delay = events[probes, 0] - events[cues, 0]
+        for pattern, limit in zip(patterns, limits):
+            hit = (~done & np.isin(codes[cues], pattern['first']) & np.isin(codes[probes], pattern['then']) &
+                   (delay <= limit))
+            new_codes[probes[hit]] = pattern['code']
+            done |= hit
+
+        events[:, 2] = new_codes
+        return events
+
+    return match
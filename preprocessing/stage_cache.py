@@ -0,0 +1,122 @@
+"""
+Created on Sat Oct 17 22:03:19 2026
+
+@author: Malte Güth
+"""
+
+# Keeping track of which intermediate files are still valid. The scripts in this repository hand their results to
+# each other through files: data_import.py saves '-raw.fif', basic_data_cleaning.py '-ica.fif',
+# epoch_average_export.py '-epo.fif' and '-ave.fif'. When a parameter of an early stage changes (say, the filter band),
+# every later file is outdated as well, but nothing tells you so.
+#
+# The stage cache writes a small manifest next to every output file ('Sub1-epo.fif.stage.json'). It contains a key
+# that is computed from the name of the stage, its parameters and the identity of its input files. For raw recordings
+# the identity is a hash of the file content; for files written by an earlier stage it is that stage's key. A change
+# anywhere upstream therefore changes the keys of all downstream stages, which are then recomputed the next time they
+# are run, while stages whose inputs and parameters are unchanged are skipped.
+#
+#   cache = StageCache()
+#   cache.run('clean', clean_subject, ['Sub1.bdf'], 'Sub1-ica.fif', l_freq=0.5, h_freq=30.)
+#   cache.run('epoch', epoch_subject, ['Sub1-raw.fif'], 'Sub1-epo.fif', tmin=-0.5, tmax=1.)
+#
+# The function of a stage is called as func(*inputs, output, **params).
+
+import hashlib
+import json
+import os
+
+MANIFEST_SUFFIX = '.stage.json'
+
+
+def file_hash(path, block_size=2 ** 20):
+    # SHA-1 of the file content, read in blocks so that large recordings don't have to fit into memory.
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fid:
+        for block in iter(lambda: fid.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class StageCache(object):
+    """Dependency-tracked cache of pipeline stage outputs.
+
+    Manifests are written next to the output files, or into manifest_dir if it is given.
+    """
+
+    def __init__(self, manifest_dir=None):
+        self.manifest_dir = manifest_dir
+        if manifest_dir is not None and not os.path.isdir(manifest_dir):
+            os.makedirs(manifest_dir)
+
+    def manifest_path(self, output):
+        if self.manifest_dir is None:
+            return output + MANIFEST_SUFFIX
+        # Keep the full path in the name, so that outputs with the same file name in different folders don't clash.
+        name = hashlib.sha1(os.path.abspath(output).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.manifest_dir, os.path.basename(output) + '.' + name + MANIFEST_SUFFIX)
+
+    def read_manifest(self, output):
+        path = self.manifest_path(output)
+        if not os.path.isfile(path):
+            return None
+        with open(path) as fid:
+            return json.load(fid)
+
+    def input_identity(self, path, previous=None):
+        """Identity of an input file: the key of the stage that wrote it, or a hash of its content.
+
+        previous is the identity recorded last time. Its content hash is reused if the size and modification time of
+        the file did not change, so unchanged raw files are not read again.
+        """
+        manifest = self.read_manifest(path)
+        if manifest is not None and os.path.isfile(path):
+            return dict(stage_key=manifest['key'])
+
+        stat = os.stat(path)
+        if (previous is not None and previous.get('size') == stat.st_size and
+                previous.get('mtime') == stat.st_mtime):
+            return previous
+        return dict(size=stat.st_size, mtime=stat.st_mtime, sha1=file_hash(path))
+
+    def key(self, stage, params, identities):
+        content = dict(stage=stage, params=params,
+                       inputs=[identity.get('stage_key', identity.get('sha1')) for identity in identities])
+        return hashlib.sha1(json.dumps(content, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+
+    def _identities(self, inputs, manifest):
+        previous = manifest.get('inputs', {}) if manifest else {}
+        return [self.input_identity(path, previous.get(path)) for path in inputs]
+
+    def is_current(self, stage, params, inputs, output):
+        """True if output exists and was computed by this stage with the same parameters and unchanged inputs."""
+        manifest = self.read_manifest(output)
+        if manifest is None or not os.path.exists(output):
+            return False
+        return manifest['key'] == self.key(stage, params, self._identities(inputs, manifest))
+
+    def record(self, stage, params, inputs, output):
+        # Write the manifest after output has been computed successfully.
+        identities = self._identities(inputs, self.read_manifest(output))
+        manifest = dict(stage=stage, key=self.key(stage, params, identities),
+                        params=json.loads(json.dumps(params, default=repr)),
+                        inputs=dict(zip(inputs, identities)))
+        path = self.manifest_path(output)
+        with open(path + '.tmp', 'w') as fid:
+            json.dump(manifest, fid, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    def invalidate(self, output):
+        # Force a stage to be recomputed, e.g. after an output file was edited by hand.
+        path = self.manifest_path(output)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    def run(self, stage, func, inputs, output, **params):
+        """Run func(*inputs, output, **params) unless output is current. Returns True if the stage was computed."""
+        if self.is_current(stage, params, inputs, output):
+            return False
+        # Remove the old manifest first: if func fails halfway, output must not look valid.
+        self.invalidate(output)
+        func(*(list(inputs) + [output]), **params)
+        self.record(stage, params, inputs, output)
+        return True
@@ -0,0 +1,231 @@
+"""
+Created on Mon Oct 19 22:41:08 2026
+
+@author: Malte Güth
+"""
+
+# Cluster-based permutation tests for contrasts of time-frequency maps (channels x frequencies x time points) or ERPs
+# (channels x time points), e.g. reward vs. no reward feedback or the baseline vs. the TMS blocks. A t-value is computed
+# for every channel, frequency and time point, and neighbouring points whose t-value exceeds threshold form clusters.
+# Points are neighbours if they are next to each other in frequency or time on the same channel, or if they are at the
+# same frequency and time on neighbouring channels. Which channels are neighbours follows from the montage
+# (mne.channels.find_ch_adjacency). The mass of a cluster (its summed t-values) is compared to the largest cluster
+# masses found after shuffling the conditions many times.
+#
+#   # Paired differences, e.g. the reward minus no reward power of every subject (n_subjects x channels x freqs x
+#   # times): the sign of each subject's difference is flipped at random.
+#   results = cluster_permutation_test([power_reward - power_noreward], info=epochs.info, n_permutations=1000)
+#
+#   # Two independent groups of observations, e.g. the single trials of two conditions: the trials are shuffled
+#   # between the conditions.
+#   results = cluster_permutation_test([epochs['reward'].get_data(), epochs['no_reward'].get_data()],
+#                                      info=epochs.info, n_jobs=4)
+#   results['p_values']     # p-value of the cluster each point belongs to (1 outside of clusters)
+#
+# The t-values of a whole batch of permutations come from a single matrix product: the sums of the shuffled
+# conditions are the product of a matrix of signs (or of condition memberships) with the data, while the sums of
+# squares of all observations don't change with sign flips or shuffling at all. The permutations are split into
+# chunks that run in parallel processes (n_jobs), each with its own random seed derived from seed, so the results don't
+# depend on the number of jobs. The data are handed to the processes as a memory-mapped file by joblib instead of
+# being copied into every process. Besides the data, memory use per process is about 2 x batch_size x the number of
+# data points x 8 bytes, e.g. 250 MB for 64 channels x 50 frequencies x 600 time points with batch_size=8.
+
+import numpy as np
+from scipy import ndimage, sparse, stats
+from scipy.sparse.csgraph import connected_components
+
+from joblib import Parallel, delayed
+
+import mne
+
+
+def channel_adjacency(info, ch_type='eeg'):
+    """Adjacency matrix (sparse, n_channels x n_channels) of the channels of ch_type in info and their names."""
+    if hasattr(mne.channels, 'find_ch_adjacency'):
+        return mne.channels.find_ch_adjacency(info, ch_type)
+    # MNE versions before 0.20 call it connectivity.
+    return mne.channels.find_ch_connectivity(info, ch_type)
+
+
+def adjacency_edges(adjacency, n_channels):
+    """Pairs of neighbouring channels (n_edges x 2, each pair once) from an adjacency matrix, or none without one."""
+    if adjacency is None:
+        return np.empty((0, 2), dtype=int)
+    adjacency = sparse.coo_matrix(adjacency)
+    if adjacency.shape != (n_channels, n_channels):
+        raise ValueError('The adjacency matrix is for %d channels, but the data have %d.'
+                         % (adjacency.shape[0], n_channels))
+    upper = adjacency.row < adjacency.col
+    return np.column_stack([adjacency.row[upper], adjacency.col[upper]])
+
+
+def _structure(ndim):
+    # Neighbours along every axis except the first (the channels), which are connected by the edges instead.
+    structure = np.zeros((3,) * ndim, dtype=bool)
+    for axis in range(1, ndim):
+        index = [1] * ndim
+        for offset in (0, 2):
+            index[axis] = offset
+            structure[tuple(index)] = True
+    structure[(1,) * ndim] = True
+    return structure
+
+
+def _label(mask, edges):
+    # Connected points of mask (channels x ...): label along frequency and time first, then merge the labels that
+    # touch each other on neighbouring channels. Returns the labels, the cluster of every label (clusters and labels
+    # numbered from 1, 0 for points outside of the mask) and the number of clusters.
+    labels, n_labels = ndimage.label(mask, _structure(mask.ndim))
+    if n_labels == 0 or not len(edges):
+        return labels, np.arange(n_labels + 1), n_labels
+    # Only the points that are in the mask on both channels of an edge are looked up in the labels.
+    edge, *rest = np.nonzero(mask[edges[:, 0]] & mask[edges[:, 1]])
+    first, second = labels[(edges[edge, 0],) + tuple(rest)], labels[(edges[edge, 1],) + tuple(rest)]
+    graph = sparse.coo_matrix((np.ones(len(first)), (first - 1, second - 1)), shape=(n_labels, n_labels))
+    n_clusters, components = connected_components(graph, directed=False)
+    return labels, np.append(0, components + 1), n_clusters
+
+
+def _signs(tail):
+    return (1, -1) if tail == 0 else (tail,)
+
+
+def find_clusters(t_values, threshold, edges, tail=0):
+    """Clusters of t_values (channels x ...) beyond threshold.
+
+    tail=1 only looks for positive clusters (t > threshold), tail=-1 for negative ones (t < -threshold) and tail=0 for
+    both. Returns the cluster of every point (0 outside of clusters, clusters numbered from 1) and the mass of every
+    cluster.
+    """
+    labels = np.zeros(t_values.shape, dtype=int)
+    masses = []
+    for sign in _signs(tail):
+        signed_labels, clusters, n_clusters = _label(sign * t_values > threshold, edges)
+        inside = signed_labels > 0
+        signed_labels = clusters[signed_labels[inside]]
+        labels[inside] = signed_labels + len(masses)
+        masses.extend(np.bincount(signed_labels, weights=t_values[inside], minlength=n_clusters + 1)[1:])
+    return labels, np.array(masses)
+
+
+def _cluster_masses(t_values, threshold, edges, tail):
+    # The masses of find_clusters without the labels of every point, for the permutations: the t-values are summed
+    # per label first, and the sums of the labels per cluster.
+    masses = []
+    for sign in _signs(tail):
+        labels, clusters, n_clusters = _label(sign * t_values > threshold, edges)
+        label_masses = np.bincount(labels.ravel(), weights=t_values.ravel(), minlength=len(clusters))
+        masses.extend(np.bincount(clusters[1:], weights=label_masses[1:], minlength=n_clusters + 1)[1:])
+    return np.array(masses)
+
+
+def _extreme(masses, tail):
+    # The statistic of the permutation distribution: the largest cluster mass in the direction of the test.
+    if not len(masses):
+        return 0.
+    return {0: np.abs(masses), 1: masses, -1: -masses}[tail].max()
+
+
+def _t_values(data, design, n_first, sum_squares, total):
+    # t-values of the permutations in design (n_permutations x n_observations) for all columns of data. With
+    # n_first=None, design holds signs and the test is a one-sample t-test against 0; otherwise it marks the
+    # observations of the first of two groups and the test is an independent t-test with pooled variance.
+    # The arithmetic is done in place, since the arrays hold a whole batch of permutations.
+    n = len(data)
+    if n_first is None:
+        mean = np.dot(design, data)
+        mean /= n
+        # Squared standard error of the mean: (sum of squares - n x mean^2) / (n - 1) / n
+        error = np.square(mean)
+        error *= -n
+        error += sum_squares
+        error /= (n - 1) * n
+        mean /= np.sqrt(error, out=error)
+        return mean
+
+    n_second = n - n_first
+    sums_first = np.dot(design, data)
+    # Sums of squares around the group means, (sum of squares - sum^2 / n) for each group, added up. The sums of
+    # squares of both groups together don't depend on the permutation.
+    pooled = np.square(sums_first) / -n_first
+    pooled -= np.square(total - sums_first) / n_second
+    pooled += sum_squares
+    pooled *= (1. / n_first + 1. / n_second) / (n - 2)
+    difference = sums_first / n_first
+    difference -= (total - sums_first) / n_second
+    difference /= np.sqrt(pooled, out=pooled)
+    return difference
+
+
+def _null_chunk(data, n_first, shape, edges, threshold, tail, seed, n_permutations, batch_size):
+    rng = np.random.default_rng(seed)
+    sum_squares = (data ** 2).sum(axis=0)
+    total = data.sum(axis=0)
+    n = len(data)
+    extremes = np.empty(n_permutations)
+    for start in range(0, n_permutations, batch_size):
+        n_batch = min(batch_size, n_permutations - start)
+        if n_first is None:
+            design = rng.choice([-1., 1.], size=(n_batch, n))
+        else:
+            design = np.zeros((n_batch, n))
+            for row in design:
+                row[rng.permutation(n)[:n_first]] = 1.
+        t_batch = _t_values(data, design, n_first, sum_squares, total)
+        for bi, t_values in enumerate(t_batch):
+            extremes[start + bi] = _extreme(_cluster_masses(t_values.reshape(shape), threshold, edges, tail), tail)
+    return extremes
+
+
+def cluster_permutation_test(X, info=None, adjacency=None, ch_type='eeg', threshold=None, tail=0,
+                             n_permutations=1000, batch_size=8, chunk_size=64, n_jobs=1, seed=0):
+    """Cluster-based permutation test of one sample (against 0) or two independent samples.
+
+    X is a list with one array (n_observations x channels x ...; e.g. paired differences) or two arrays (the
+    observations of both conditions). The channel neighbours come from adjacency or, without it, from the montage of
+    info. threshold defaults to the t-value of p < 0.05 (two-sided for tail=0). Returns a dict with the t-values
+    ('t_obs'), the cluster of every point ('labels', 0 outside of clusters), the cluster masses and p-values
+    ('cluster_masses', 'cluster_p'), the p-value of every point ('p_values', 1 outside of clusters) and the largest
+    cluster mass of every permutation ('max_masses').
+    """
+    X = [np.asarray(x, dtype=float) for x in X]
+    shape = X[0].shape[1:]
+    if adjacency is None and info is not None:
+        adjacency, _ = channel_adjacency(info, ch_type)
+    edges = adjacency_edges(adjacency, shape[0])
+
+    if len(X) == 1:
+        data = X[0].reshape(len(X[0]), -1)
+        n_first, df = None, len(data) - 1
+        design = np.ones((1, len(data)))
+    elif len(X) == 2:
+        # The t-values of two groups don't change if all data are shifted, and centering keeps the sums of squares
+        # accurate.
+        data = np.concatenate([x.reshape(len(x), -1) for x in X])
+        data -= data.mean(axis=0)
+        n_first, df = len(X[0]), len(data) - 2
+        design = (np.arange(len(data)) < n_first)[np.newaxis].astype(float)
+    else:
+        raise ValueError('X has to hold one or two arrays, not %d.' % len(X))
+    if threshold is None:
+        threshold = stats.t.ppf(1 - 0.05 / (2 if tail == 0 else 1), df)
+
+    t_obs = _t_values(data, design, n_first, (data ** 2).sum(axis=0), data.sum(axis=0))[0].reshape(shape)
+    labels, masses = find_clusters(t_obs, threshold, edges, tail)
+
+    chunks = [chunk_size] * (n_permutations // chunk_size)
+    if n_permutations % chunk_size:
+        chunks.append(n_permutations % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    results = Parallel(n_jobs=n_jobs)(delayed(_null_chunk)(data, n_first, shape, edges, threshold, tail, chunk_seed,
+                                                           n_chunk, batch_size)
+                                      for chunk_seed, n_chunk in zip(seeds, chunks))
+    max_masses = np.concatenate(results)
+
+    # The observed data count as one of the permutations, so p-values are never 0.
+    observed = {0: np.abs(masses), 1: masses, -1: -masses}[tail]
+    cluster_p = (1 + (max_masses >= observed[:, np.newaxis]).sum(axis=-1)) / (n_permutations + 1.)
+    p_values = np.ones(shape)
+    p_values[labels > 0] = cluster_p[labels[labels > 0] - 1]
+    return dict(t_obs=t_obs, labels=labels, cluster_masses=masses, cluster_p=cluster_p, p_values=p_values,
+                max_masses=max_masses, threshold=threshold)
@@ -0,0 +1,121 @@
+"""
+Created on Sat Oct 17 20:05:37 2026
+
+@author: Malte Güth
+"""
+
+# Group-level time-frequency results without holding all epochs of a study in memory. Instead of concatenating the
+# epochs of every subject and transforming them at the end, each subject's epochs are transformed as soon as they are
+# read and only running sums are kept: the summed power, the summed squared deviations of the power from its running
+# mean (for the variance across trials) and the summed phase vectors (for the inter-trial coherence, ITC). Memory use
+# therefore depends on the number of channels, frequencies and sample points, but not on the number of subjects.
+# The wavelet transform is linear, so the transform of the evoked response is simply the average of the single trial
+# transforms. Each block of epochs that is added (one subject or one condition) therefore also yields its evoked
+# (phase-locked) power and the induced power, i.e. the power left after subtracting the block's evoked response from
+# every trial, without a second transform of the data.
+
+import numpy as np
+
+from wavelet_engine import wavelet_transform
+
+try:
+    from mne.time_frequency import AverageTFRArray as _AverageTFR  # MNE >= 1.7
+except ImportError:
+    from mne.time_frequency import AverageTFR as _AverageTFR
+
+
+class TFRAccumulator(object):
+    """Running sums of single trial wavelet power for a grand average.
+
+    bank is a wavelet bank from wavelet_engine.morlet_bank (or a WaveletCache). Epochs are transformed in batches of
+    batch_size trials and the results are decimated by taking every decim-th sample point.
+    """
+
+    def __init__(self, bank, decim=1, batch_size=32):
+        self.bank = bank
+        self.decim = decim
+        self.batch_size = batch_size
+        self.n_trials = 0
+        self.n_subjects = 0
+        self.power_sum = None
+        self.power_m2 = None
+        self.phase_sum = None
+        self.evoked_sum = None
+
+    def add_epochs(self, data):
+        """Add a block of epochs (n_epochs x n_channels x n_samples), e.g. epochs.get_data() of one subject.
+
+        The evoked response that is subtracted for the induced power is the average of this block, so add each
+        subject (and condition) separately.
+        """
+        data = np.asarray(data)
+        n_times = len(range(0, data.shape[-1], self.decim))
+        shape = (data.shape[1], len(self.bank['freqs']), n_times)
+        if self.power_sum is None:
+            self.power_sum = np.zeros(shape)
+            self.power_m2 = np.zeros(shape)
+            self.phase_sum = np.zeros(shape, dtype=complex)
+            self.evoked_sum = np.zeros(shape)
+
+        coef_sum = np.zeros(shape, dtype=complex)
+        for start in range(0, len(data), self.batch_size):
+            batch = data[start:start + self.batch_size]
+            n_before = self.n_trials + start
+            for fi, coefs in wavelet_transform(batch, self.bank):
+                coefs = coefs[..., ::self.decim]
+                power = coefs.real ** 2 + coefs.imag ** 2
+                # Squared deviations from the batch mean, merged with those of the trials so far (Chan et al.). Summing
+                # squared power instead would cancel badly, since the power values (in V^2) are tiny and close together.
+                batch_mean = power.mean(axis=0)
+                if n_before:
+                    delta = batch_mean - self.power_sum[:, fi] / n_before
+                    self.power_m2[:, fi] += delta ** 2 * (n_before * len(batch) / float(n_before + len(batch)))
+                self.power_m2[:, fi] += ((power - batch_mean) ** 2).sum(axis=0)
+                self.power_sum[:, fi] += power.sum(axis=0)
+                # Phase vectors of unit length; time points with zero power don't contribute any phase.
+                self.phase_sum[:, fi] += (coefs / np.where(power > 0, np.sqrt(power), 1.)).sum(axis=0)
+                coef_sum[:, fi] += coefs.sum(axis=0)
+
+        # Power of the block's evoked response, weighted by the number of trials in the block.
+        self.evoked_sum += (coef_sum.real ** 2 + coef_sum.imag ** 2) / len(data)
+        self.n_trials += len(data)
+        self.n_subjects += 1
+
+    def mean(self):
+        # Average power over all trials that were added so far.
+        return self.power_sum / self.n_trials
+
+    def variance(self):
+        # Unbiased variance of the single trial power across all trials.
+        return self.power_m2 / (self.n_trials - 1)
+
+    def evoked(self):
+        # Power of the evoked (phase-locked) response.
+        return self.evoked_sum / self.n_trials
+
+    def induced(self):
+        # Total power minus the power of the evoked response, i.e. the average power of the single trials after the
+        # evoked response was subtracted from each of them.
+        return (self.power_sum - self.evoked_sum) / self.n_trials
+
+    def itc(self):
+        return np.abs(self.phase_sum) / self.n_trials
+
+    def to_average_tfr(self, info, times, kind='power', comment=None):
+        """Return the accumulated results as an MNE AverageTFR.
+
+        kind is one of 'power' (total power), 'evoked', 'induced' or 'itc'. info and times are those of the epochs
+        that were added, with info only containing the channels that were transformed.
+        """
+        if kind == 'power':
+            data = self.mean()
+        elif kind == 'evoked':
+            data = self.evoked()
+        elif kind == 'induced':
+            data = self.induced()
+        elif kind == 'itc':
+            data = self.itc()
+        else:
+            raise ValueError("kind has to be 'power', 'evoked', 'induced' or 'itc', got %r." % (kind,))
+        times = np.asarray(times)[::self.decim]
+        return _AverageTFR(info, data, times, self.bank['freqs'], nave=self.n_trials, comment=comment)
@@ -7,41 +7,88 @@ Created on Mon Jun 11 21:01:45 2018
 # analysis with a pre-defined wavelet. Please mind that wavelet parameters should suit your data and your analysis.
 # This is merely an example of a wavelet José and I often use for our experiments.
 
+import glob
+import os
+
 import mne
 
 import numpy as np
 import matplotlib.pyplot as plt
 
-# Start by loading all relevant epochs and concatenating them. Again, I will use the example of passive music listening.
-path = 'path to your epochs'     
-for filename in glob.glob(os.path.join(path, '*-epo.fif')):
-    epochs = mne.io.read_epochs_fif(filename, events=None, event_id=None, montage=chanlocs, eog=(), verbose=None, 
-                                    uint16_codec=None)
-    evoked = epochs.average()
-    if filename == './Sub1.fif': # At this point, I usually pick the first data set in the directory I want to load.
-        list_music = []
-        list_music.append(evoked) # Append the evoked responses in a list, so that you can also plot evoked
-                                  # responses next to the time-frequency results.
-        all_epochs = epochs
-    else:
-        list_music.append(evoked)
-        all_epochs = mne.concatenate_epochs([all_epochs, epochs])
-        
+from tfr_accumulator import TFRAccumulator
+from wavelet_cache import WaveletCache
+
 # Define wavelet parameters.
 
 decim = 3
 freqs = np.logspace(*np.log10([1, 50]), num=50)
-cycles = np.logspace(np.log10(3), np.log10(10), 30)/(2*np.pi*freqs)
+cycles = np.logspace(np.log10(3), np.log10(10), 50)
+
+# Wavelets are only built once for each sampling rate and epoch length (see wavelet_cache.py).
+wavelet_cache = WaveletCache()
+# As in mne.time_frequency.tfr_morlet, the wavelets reach 5 standard deviations of the widest gaussian to both sides
+# (a whole number of sample points, so the wavelets are centered on a sample point), so the slow wavelets are not cut
+# off (the default of morlet_bank is 1 s to both sides). The wavelets are scaled as in total_power_custom.py rather
+# than as in MNE, which only changes the power by a constant per frequency, i.e. the baseline-corrected maps below
+# are those of tfr_morlet (up to its zero-mean correction, a difference of about 2 % at the lowest frequencies).
+max_sigma = (cycles / (2 * np.pi * freqs)).max()
 
-# Compute time-frequency results with a Morlet wavelet.
-tfr_epochs = mne.time_frequency.tfr_morlet(all_epochs['music_onset', freqs, n_cycles=cycles, use_fft=True,
-                                           decim=decim, average=True, return_itc=False, n_jobs=1)
+# Start by loading all relevant epochs. Again, I will use the example of passive music listening.
+# Instead of concatenating all epochs of all subjects, which keeps the whole study in memory, the epochs of each
+# subject are transformed right away and added to running sums for the grand average.
+path = 'path to your epochs'
+list_music = []
+tfr_sum = None
+for filename in glob.glob(os.path.join(path, '*-epo.fif')):
+    epochs = mne.read_epochs(filename)
+    evoked = epochs.average()
+    list_music.append(evoked) # Append the evoked responses in a list, so that you can also plot evoked
+                              # responses next to the time-frequency results.
+
+    epochs_music = epochs['music_onset'].pick_types(eeg=True)
+    if tfr_sum is None:
+        sfreq = epochs.info['sfreq']
+        wavelet_duration = 2 * np.ceil(5 * max_sigma * sfreq) / sfreq
+        bank = wavelet_cache.get(sfreq, len(epochs.times), freqs, cycles, wavelet_duration)
+        tfr_sum = TFRAccumulator(bank, decim=decim)
+        info, times = epochs_music.info, epochs_music.times
+    tfr_sum.add_epochs(epochs_music.get_data())
+    # If the epochs were also saved with save_epochs_store (see epochs_store.py in the preprocessing folder), only the
+    # music onset epochs of the EEG channels have to be read from disk:
+    #   store = EpochsStore(filename[:-len('-epo.fif')] + '-store.npy')
+    #   tfr_sum.add_epochs(store.get_data('music_onset', picks=epochs_music.ch_names))
+
+# Compute time-frequency results with a Morlet wavelet, averaged over all trials of all subjects.
+tfr_epochs = tfr_sum.to_average_tfr(info, times, comment='music_onset')
 epochs_power_music = tfr_epochs.data
 
+# Total power contains both the activity that is phase-locked to the music onset (evoked power) and the activity
+# that is not (induced power). Since every subject was added separately, the induced power is computed with each
+# subject's own evoked response subtracted from their trials. Both come from the same running sums as total power,
+# so the data don't have to be transformed a second time.
+tfr_evoked = tfr_sum.to_average_tfr(info, times, kind='evoked', comment='music_onset')
+tfr_induced = tfr_sum.to_average_tfr(info, times, kind='induced', comment='music_onset')
+tfr_itc = tfr_sum.to_average_tfr(info, times, kind='itc', comment='music_onset')
+
 # To check event-related changes across all electrodes, plot results as a topolplot. Be careful with baseline
 # corrections, so you don't perform them twice.
 tfr_epochs.plot_topo(baseline=(-1.5,-0.5), mode='logratio', font_color='k')
 
 # Check results at a specific electrode you picked.
-tfr_epochs.plot([46], baseline=(-1.5, -0.5), mode='logratio', 
-                title='Total power at ' + tfr_epochs_a.ch_names[46])
+tfr_epochs.plot([46], baseline=(-1.5, -0.5), mode='logratio',
+                title='Total power at ' + tfr_epochs.ch_names[46])
+tfr_induced.plot([46], baseline=(-1.5, -0.5), mode='logratio',
+                 title='Induced power at ' + tfr_induced.ch_names[46])
+
+# If you want to compare conditions within a single subject, power_decomposition from wavelet_engine.py returns total,
+# evoked and induced power plus ITC for every condition with a single transform of the subject's epochs:
+#
+# results = power_decomposition(epochs.get_data(), bank, conditions=epochs.events[:, 2], decim=decim)
+# results[epochs.event_id['heavy_metal']]['induced']
+#
+# To test where two conditions differ, e.g. each subject's induced power for two kinds of music, without picking an
+# electrode and a time window in advance, run a cluster-based permutation test over all channels, frequencies and time
+# points with cluster_permutation.py. Neighbouring channels follow from the montage in info:
+#
+# results = cluster_permutation_test([power_heavy_metal - power_classical], info=info, n_permutations=1000, n_jobs=4)
+# results['cluster_p']  # p-value of every cluster, results['labels'] shows where each cluster is
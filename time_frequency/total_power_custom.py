@@ -6,64 +6,44 @@ Created on Sat Jun 16 21:14:04 2018
 
 import mne
 import numpy as np
-import math
 
 import glob
 import os
 
-elec=65
-
-def nextpow2(n):
-    m_f = np.log2(n)
-    m_i = np.ceil(m_f)
-    return int(np.log2(2**m_i))
+from wavelet_cache import WaveletCache
+from wavelet_engine import total_power, baseline_db
 
 output_dir = 'your output directory for time-frequency results'
-data_path = 'your path to all your epoched files' 
+data_path = 'your path to all your epoched files'
+cache_dir = 'your directory for cached wavelets'
+
+# Wavelet parameters: 30 logarithmically spaced frequencies from 1 to 30 Hz with 3 to 10 cycles.
+min_frex =  1
+max_frex = 30
+num_frex = 30
+
+frex = np.logspace(np.log10(min_frex), np.log10(max_frex), num_frex)
+cycles = np.logspace(np.log10(3), np.log10(10), num_frex)
+
+# The wavelet spectra only depend on the sampling rate, the epoch length and the frequency grid, so they are built
+# once for each combination and re-used for all following files. With a cache directory they are also kept on disk,
+# so that re-running the script skips building them as well.
+wavelet_cache = WaveletCache(cache_dir)
 
 for epochs in glob.glob(os.path.join(data_path, '*.fif')):
 
     EEG = mne.read_epochs(epochs)
+    picks = mne.pick_types(EEG.info, eeg=True)
+
+    bank = wavelet_cache.get(EEG.info['sfreq'], len(EEG.times), frex, cycles)
 
-    for E in range(1,elec):
-        
-        tmin=min(EEG.times)
-        tmax=max(EEG.times)
-        
-        min_frex =  1
-        max_frex = 30
-        num_frex = 30
-        
-        time = np.arange(-1, 1.0001, 1/EEG.info['sfreq'])
-        pnts = int(EEG.info['sfreq']*(tmax+(tmin*-1))+1)
-        frex = np.logspace(np.log10(min_frex), np.log10(max_frex), num_frex)
-        cycles = np.logspace(np.log10(3), np.log10(10), num_frex)/(2*np.pi*frex)
-        
-        n_wavelet            = time.size
-        n_data               = pnts*len(EEG)
-        n_convolution        = n_wavelet+n_data-1
-        n_conv_pow2          = int(math.pow(2,nextpow2(n_convolution)))
-        half_of_wavelet_size = (n_wavelet-1)/2
-        
-        data = EEG.get_data()
-        eegfft = np.fft.fft(np.reshape(data[:,E,:], (1, int(pnts*len(EEG)))), n_conv_pow2)
-        
-        timef = np.zeros((num_frex,pnts,int(len(EEG))))
-        
-        baseidx = EEG.time_as_index((-1.7, -0.3))
-        
-        for fi in range(1,num_frex):
-            
-            w = math.sqrt(1/(cycles[fi]*math.sqrt(np.pi))) * np.exp(np.multiply(2*1j*np.pi*frex[fi], time))
-            wavelet = np.fft.fft(np.multiply(w, np.exp(-time**2./(2*(cycles[fi]**2)))), n_conv_pow2 )
-            
-            eegconv = np.fft.ifft(wavelet*eegfft)
-            eegconv = eegconv[0:n_convolution]
-            eegconv = eegconv[int(half_of_wavelet_size+1):int(eegconv.size-half_of_wavelet_size)]
+    # All electrodes and all trials are convolved in one go, which returns the trial-averaged power as an array of
+    # electrodes x frequencies x sample points.
+    data = EEG.get_data()[:, picks, :]
+    power = total_power(data, bank)
 
-            temppower = np.mean(abs(np.reshape(eegconv, (pnts,len(EEG))))**2,2)
-            timef[fi,:] = 10*np.log10(temppower/np.mean(temppower[baseidx[1]:baseidx[2]]))
+    # Decibel conversion relative to a baseline from -1700 to -300 ms.
+    timef = baseline_db(power, EEG.times, (-1.7, -0.3))
 
-        filepath, filename = os.path.split(epochs)
-        np.savetxt(output_dir + filename + '_timef.csv', timef)
-        
+    filepath, filename = os.path.split(epochs)
+    np.save(output_dir + filename + '_timef.npy', timef)
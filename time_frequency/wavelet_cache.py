@@ -0,0 +1,139 @@
+"""
+Created on Sat Oct 17 19:31:44 2026
+
+@author: Malte Güth
+"""
+
+# A cache for the wavelet banks from wavelet_engine.py. Most recordings of a study share the same sampling rate,
+# epoch length and frequency grid, so the wavelet spectra only have to be built once. Banks are kept in memory and,
+# if a cache directory is given, written to disk as .npy files that are memory-mapped when they are read again. That
+# way re-runs of a script (or a second script with the same parameters) skip building the wavelets entirely.
+# The least recently used banks are dropped when the cache grows beyond its limits.
+
+import collections
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from wavelet_engine import morlet_bank
+
+# Bump this if the way morlet_bank builds the wavelets changes, so that old files on disk are not used anymore.
+CACHE_VERSION = 1
+
+
+def bank_key(sfreq, n_samples, freqs, n_cycles, wavelet_duration=2.):
+    # Content-addressed key: a hash over all parameters that determine the wavelet spectra.
+    freqs = np.atleast_1d(np.asarray(freqs, dtype=float))
+    n_cycles = np.broadcast_to(np.asarray(n_cycles, dtype=float), freqs.shape)
+    params = dict(version=CACHE_VERSION, sfreq=float(sfreq), n_samples=int(n_samples),
+                  freqs=freqs.tolist(), n_cycles=n_cycles.tolist(),
+                  wavelet_duration=float(wavelet_duration))
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class WaveletCache(object):
+    """In-memory and on-disk LRU cache of wavelet banks.
+
+    max_items limits the number of banks held in memory. If cache_dir is given, banks are also stored there and the
+    files are evicted (least recently used first) once they take up more than max_bytes on disk.
+    """
+
+    def __init__(self, cache_dir=None, max_items=8, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._banks = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get(self, sfreq, n_samples, freqs, n_cycles, wavelet_duration=2.):
+        key = bank_key(sfreq, n_samples, freqs, n_cycles, wavelet_duration)
+
+        if key in self._banks:
+            self._banks.move_to_end(key)
+            self.hits += 1
+            return self._banks[key]
+
+        bank = self._load(key)
+        if bank is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            bank = morlet_bank(sfreq, n_samples, freqs, n_cycles, wavelet_duration)
+            self._store(key, bank)
+
+        self._banks[key] = bank
+        while len(self._banks) > self.max_items:
+            self._banks.popitem(last=False)
+        return bank
+
+    def clear(self):
+        # Only empties the memory part of the cache, files on disk are kept.
+        self._banks.clear()
+
+    def _paths(self, key):
+        return (os.path.join(self.cache_dir, key + '.json'),
+                os.path.join(self.cache_dir, key + '.npy'))
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        meta_file, spectra_file = self._paths(key)
+        if not (os.path.isfile(meta_file) and os.path.isfile(spectra_file)):
+            return None
+
+        with open(meta_file) as fid:
+            bank = json.load(fid)
+        bank['freqs'] = np.array(bank['freqs'])
+        bank['n_cycles'] = np.array(bank['n_cycles'])
+        bank['spectra'] = np.load(spectra_file, mmap_mode='r')
+
+        # Touch the files so that the eviction sees them as recently used.
+        os.utime(meta_file, None)
+        os.utime(spectra_file, None)
+        return bank
+
+    def _store(self, key, bank):
+        if self.cache_dir is None:
+            return
+        meta_file, spectra_file = self._paths(key)
+
+        # Write to temporary files first, so that a crash or a second process never leaves half a file behind.
+        np.save(spectra_file + '.tmp.npy', bank['spectra'])
+        os.replace(spectra_file + '.tmp.npy', spectra_file)
+        meta = dict((k, v) for k, v in bank.items() if k != 'spectra')
+        meta['freqs'] = bank['freqs'].tolist()
+        meta['n_cycles'] = bank['n_cycles'].tolist()
+        with open(meta_file + '.tmp', 'w') as fid:
+            json.dump(meta, fid)
+        os.replace(meta_file + '.tmp', meta_file)
+
+        self._evict()
+
+    def _evict(self):
+        # Temporary files belong to banks that another process is still writing, so they are never evicted.
+        files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir)
+                 if f.endswith('.npy') and not f.endswith('.tmp.npy')]
+        sizes = dict()
+        for spectra_file in files:
+            try:
+                sizes[spectra_file] = (os.path.getmtime(spectra_file), os.path.getsize(spectra_file))
+            except OSError:
+                # Already evicted by another process.
+                pass
+        files = sorted(sizes, key=lambda f: sizes[f][0])
+        total = sum(size for _, size in sizes.values())
+        for spectra_file in files[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= sizes[spectra_file][1]
+            meta_file = spectra_file[:-len('.npy')] + '.json'
+            for filename in (spectra_file, meta_file):
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
@@ -0,0 +1,153 @@
+"""
+Created on Sat Oct 17 18:52:10 2026
+
+@author: Malte Güth
+"""
+
+# Helper functions for computing Morlet wavelet power on whole blocks of epoched data. Instead of convolving one
+# electrode and one frequency at a time, the wavelet spectra are built once per sampling rate and epoch length (a
+# "bank") and every epoch of every channel is convolved with them in a single batched pass. The scripts in this folder
+# import these functions, e.g. 'from wavelet_engine import morlet_bank, total_power'.
+
+import numpy as np
+
+
+def nextpow2(n):
+    # Exponent of the next power of two, as in MATLAB (nextpow2(1000) -> 10).
+    return int(np.ceil(np.log2(n)))
+
+
+def morlet_bank(sfreq, n_samples, freqs, n_cycles, wavelet_duration=2.):
+    """Precompute the FFTs of complex Morlet wavelets for one epoch length.
+
+    The wavelets are sampled from -wavelet_duration/2 to +wavelet_duration/2 seconds and normalized the same way as
+    in total_power_custom.py. n_cycles is the number of cycles per frequency (a scalar or one value per frequency),
+    so the width of the gaussian taper is n_cycles / (2 * pi * freq) seconds.
+
+    Returns a dict with the wavelet spectra (n_freqs x n_fft) and everything needed to convolve and trim epochs of
+    n_samples sample points.
+    """
+    freqs = np.atleast_1d(np.asarray(freqs, dtype=float))
+    n_cycles = np.broadcast_to(np.asarray(n_cycles, dtype=float), freqs.shape)
+
+    time = np.arange(-wavelet_duration / 2., wavelet_duration / 2. + 1. / sfreq, 1. / sfreq)
+    n_wavelet = time.size
+    n_convolution = n_wavelet + n_samples - 1
+    n_fft = 2 ** nextpow2(n_convolution)
+
+    # The width of the gaussian in seconds for each frequency.
+    sigma = n_cycles / (2 * np.pi * freqs)
+
+    wavelets = (np.sqrt(1. / (sigma[:, np.newaxis] * np.sqrt(np.pi))) *
+                np.exp(2j * np.pi * freqs[:, np.newaxis] * time) *
+                np.exp(-time ** 2 / (2 * sigma[:, np.newaxis] ** 2)))
+    spectra = np.fft.fft(wavelets, n_fft, axis=-1)
+
+    return dict(sfreq=float(sfreq), n_samples=int(n_samples), n_fft=int(n_fft),
+                half_wavelet=int((n_wavelet - 1) // 2), freqs=freqs, n_cycles=np.array(n_cycles),
+                spectra=spectra)
+
+
+def wavelet_transform(data, bank):
+    """Convolve a block of epochs with every wavelet in the bank.
+
+    data has the shape (n_epochs, n_channels, n_samples). The data are transformed with a single real FFT and the
+    function yields (frequency index, complex coefficients) for each frequency, with the coefficients having the same
+    shape as data.
+    """
+    data = np.asarray(data)
+    if data.shape[-1] != bank['n_samples']:
+        raise ValueError('The wavelet bank was built for %d samples, but the data have %d.'
+                         % (bank['n_samples'], data.shape[-1]))
+
+    n_fft = bank['n_fft']
+    n_samples = bank['n_samples']
+    start = bank['half_wavelet']
+
+    # The data are real, so the negative frequencies of their spectrum are just the complex conjugates of the positive
+    # ones. Only the positive half is computed and the rest is mirrored for each wavelet, because the complex wavelets
+    # themselves are not symmetric in frequency.
+    data_fft = np.fft.rfft(data, n_fft, axis=-1)
+    n_pos = data_fft.shape[-1]
+    mirrored = np.conj(data_fft[..., 1:n_fft - n_pos + 1][..., ::-1])
+
+    product = np.empty(data.shape[:-1] + (n_fft,), dtype=complex)
+    for fi, spectrum in enumerate(bank['spectra']):
+        np.multiply(data_fft, spectrum[:n_pos], out=product[..., :n_pos])
+        np.multiply(mirrored, spectrum[n_pos:], out=product[..., n_pos:])
+        yield fi, np.fft.ifft(product, axis=-1)[..., start:start + n_samples]
+
+
+def total_power(data, bank, average=True):
+    """Total power for all channels and frequencies of a block of epochs.
+
+    Returns an array of n_channels x n_freqs x n_samples if average is True, otherwise the single trial power with
+    the shape n_epochs x n_channels x n_freqs x n_samples.
+    """
+    data = np.asarray(data)
+    n_epochs, n_channels, n_samples = data.shape
+    n_freqs = len(bank['freqs'])
+
+    if average:
+        power = np.empty((n_channels, n_freqs, n_samples))
+    else:
+        power = np.empty((n_epochs, n_channels, n_freqs, n_samples))
+
+    for fi, coefs in wavelet_transform(data, bank):
+        trial_power = coefs.real ** 2 + coefs.imag ** 2
+        if average:
+            power[:, fi] = trial_power.mean(axis=0)
+        else:
+            power[:, :, fi] = trial_power
+    return power
+
+
+def baseline_db(power, times, baseline):
+    # Convert power to decibel change relative to the mean power in the baseline window (tmin, tmax) in seconds.
+    times = np.asarray(times)
+    mask = (times >= baseline[0]) & (times <= baseline[1])
+    return 10 * np.log10(power / power[..., mask].mean(axis=-1, keepdims=True))
+
+
+def power_decomposition(data, bank, conditions=None, decim=1):
+    """Total, evoked and induced power plus ITC for several conditions from one wavelet transform.
+
+    conditions holds one label per epoch (e.g. epochs.events[:, 2]); without it all epochs belong to one condition.
+    Because the convolution is linear, the transform of a condition's evoked response is the average of its single
+    trial transforms, so the evoked response never has to be subtracted from the data and transformed again.
+
+    Returns a dict with one entry per condition, each a dict with 'total', 'evoked', 'induced' and 'itc' arrays of
+    n_channels x n_freqs x n_times and the number of trials 'nave'.
+    """
+    data = np.asarray(data)
+    if conditions is None:
+        conditions = np.zeros(len(data), dtype=int)
+    labels, inverse = np.unique(np.asarray(conditions), return_inverse=True)
+
+    # One row per condition that selects its trials, so that the sums over the trials of all conditions are computed
+    # with one matrix product per frequency.
+    selection = (inverse == np.arange(len(labels))[:, np.newaxis]).astype(float)
+    nave = selection.sum(axis=1)
+
+    n_times = len(range(0, data.shape[-1], decim))
+    shape = (len(labels), data.shape[1], len(bank['freqs']), n_times)
+    total = np.empty(shape)
+    evoked = np.empty(shape)
+    itc = np.empty(shape)
+
+    norm = nave[:, np.newaxis, np.newaxis]
+    for fi, coefs in wavelet_transform(data, bank):
+        coefs = coefs[..., ::decim]
+        power = coefs.real ** 2 + coefs.imag ** 2
+        phase = coefs / np.where(power > 0, np.sqrt(power), 1.)
+
+        mean_coefs = np.tensordot(selection, coefs, axes=1) / norm
+        total[:, :, fi] = np.tensordot(selection, power, axes=1) / norm
+        evoked[:, :, fi] = mean_coefs.real ** 2 + mean_coefs.imag ** 2
+        itc[:, :, fi] = np.abs(np.tensordot(selection, phase, axes=1)) / norm
+
+    results = dict()
+    for ci, label in enumerate(labels.tolist()):
+        results[label] = dict(total=total[ci], evoked=evoked[ci], induced=total[ci] - evoked[ci],
+                              itc=itc[ci], nave=int(nave[ci]))
+    return results